@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+'''
+Throughput and memory of the streaming export endpoint, every row of the user
+table as NDJSON, CSV and streamed JSON
+
+    python3 benchmarks/bench_export.py [--rows 1000000] [--fields username,email]
+
+Throughput is measured over the whole table. Peak memory is traced over 1, 5,
+25 and 125 times `export_chunk_size` rows (as far as the table goes) and should
+stay flat as the row count grows, an export only ever holds a chunk of rows.
+`--fields ''` exports every field, including the many to many ones, which are
+prefetched chunk by chunk.
+'''
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from restmore.crud import DjangoModelResource
+
+FORMATS = ('application/x-ndjson', 'text/csv', 'application/json')
+
+
+def populate(rows, batch_size=10000):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    for start in range(0, rows, batch_size):
+        User.objects.bulk_create([User(username='user%s' % index, email='user%s@domain.com' % index,
+            first_name='First', last_name='Last') for index in range(start, min(start + batch_size, rows))])
+    return User.objects.create_superuser('bench', 'bench@domain.com', 'bench')
+
+
+def make_resource(superuser):
+    class ExportResource(DjangoModelResource):
+        model = User
+        exportable = True
+        filter_by = ('id',)
+
+        def get_identity(self):
+            return superuser
+
+    return ExportResource
+
+
+def export(client, accept, path):
+    '''
+    Reads the streamed body chunk by chunk, returns the bytes received
+    '''
+    response = client.get(path, HTTP_ACCEPT=accept)
+    assert response.status_code == 200 and response.streaming, (accept, response.status_code)
+    size = 0
+    for chunk in response.streaming_content:
+        size += len(chunk)
+    response.close()
+    return size
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(rows, fields):
+    superuser = populate(rows)
+    urls = types.ModuleType('benchmark_urls')
+    urls.urlpatterns = list(make_resource(superuser).urls())
+    client = Client()
+    total = superuser.pk
+    chunk_size = DjangoModelResource.export_chunk_size
+    path = '/export/?fields=%s' % fields if fields else '/export/'
+    counts = sorted(set(min(chunk_size * chunks, total) for chunks in (1, 5, 25, 125)))
+    if counts[-1] < chunk_size * 5:
+        print('only %s rows, use --rows %s or more to see memory across chunks' % (total, chunk_size * 5))
+    with override_settings(ROOT_URLCONF=urls, DEBUG=False):
+        clear_url_caches()
+        for accept in FORMATS:
+            start = time.perf_counter()
+            size = export(client, accept, path)
+            seconds = time.perf_counter() - start
+            print('%-22s %10.0f rows/s %8.1f MiB/s' % (accept, total / seconds, size / seconds / 2 ** 20))
+            for count in counts:
+                sliced = '%s%sid__range=1,%s' % (path, '&' if fields else '?', count)
+                peak = peak_memory(lambda: export(client, accept, sliced))
+                print('    %10s rows %6.1f chunks %8.0f KiB peak' % (count, count / float(chunk_size), peak / 1024.))
+        clear_url_caches()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='rows in the user table')
+    parser.add_argument('--fields', default='username,email,first_name,last_name,is_active,date_joined',
+        help='comma separated fields to export, empty for all of them')
+    args = parser.parse_args(argv)
+    run(args.rows, args.fields)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
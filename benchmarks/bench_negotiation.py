@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+'''
+Micro-benchmark for content negotiation, uncached mimeparse matching vs the memoized lookup
+
+    python3 benchmarks/bench_negotiation.py
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+
+import django
+django.setup()
+
+from restmore import settings
+from restmore.presentors import negotiate, resolve_negotiation
+
+#a handful of distinct header values, like real traffic
+HEADERS = [
+    (None, 'application/json'),
+    ('application/json', 'application/json'),
+    ('multipart/form-data; boundary=xyz', 'application/json, text/plain, */*'),
+    (None, 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'),
+    ('application/x-www-form-urlencoded', '*/*'),
+]
+
+
+def uncached():
+    for content_type, accept in HEADERS:
+        resolve_negotiation(content_type, accept, settings.SERIALIZERS, settings.PRESENTORS)
+
+
+def cached():
+    for content_type, accept in HEADERS:
+        negotiate(content_type, accept, settings.VERSION)
+
+
+if __name__ == '__main__':
+    number = 2000
+    for name, func in (('uncached', uncached), ('cached', cached)):
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print('%-8s %8.2f us/request' % (name, seconds / (number * len(HEADERS)) * 1e6))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+'''
+Micro-benchmark for JSON output, normalize_data followed by json.dumps (two passes)
+vs the fused NormalizingJSONSerializer (one pass), each up to the HttpResponse
+body so the str -> bytes encoding of the two-pass path is counted
+
+    python3 benchmarks/bench_serializers.py [rows]
+'''
+import datetime
+import decimal
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+
+from restmore.normalizer import Normalizer
+from restmore.serializers import JSONSerializer, NormalizingJSONSerializer
+
+
+def make_page(rows):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    User.objects.bulk_create([User(username='user%s' % index, email='user%s@domain.com' % index)
+        for index in range(rows)])
+    users = list(User.objects.prefetch_related('groups', 'user_permissions'))
+    return {
+        'objects': users,
+        'meta': [{'index': index, 'price': decimal.Decimal(index) / 100,
+            'seen': datetime.datetime(2020, 1, 1), 'tags': ['a', 'b', 'c']} for index in range(rows)],
+    }
+
+
+def two_pass(data):
+    return HttpResponse(JSONSerializer().serialize(Normalizer(None, None).normalize(data))).content
+
+
+def fused(data):
+    return HttpResponse(NormalizingJSONSerializer().serialize(data)).content
+
+
+def peak_memory(func, data):
+    tracemalloc.start()
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    data = make_page(rows)
+    assert len(two_pass(data)) == len(fused(data))
+    number = 10
+    for name, func in (('two-pass', two_pass), ('fused', fused)):
+        seconds = min(timeit.repeat(lambda: func(data), number=number, repeat=5)) / number
+        print('%-8s %8.2f ms/page %8.0f KiB peak' % (name, seconds * 1e3, peak_memory(func, data) / 1024.))
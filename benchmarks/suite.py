@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+'''
+Benchmark suite for the request pipeline, runs on an in-memory SQLite database
+against synthetic models `width` columns wide with a foreign key chain `depth` deep
+
+    python3 benchmarks/suite.py --output results.json
+    python3 benchmarks/suite.py --baseline results.json --tolerance 0.25
+
+Results are written as JSON, `{"config": {...}, "results": {name: {"seconds": .., "queries": ..}}}`.
+Against a baseline the exit status is 1 when any benchmark is slower than the
+tolerance allows or issues more queries then before, and 2 when the baseline
+was recorded with another width, depth or row count.
+
+`benchmarks/baseline.json` holds the default configuration. Its query counts
+hold anywhere, its timings only on the machine that recorded them, so
+compare timings against a baseline recorded with `--output` on the same
+machine (ie on the target branch before a change).
+'''
+import argparse
+import json
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import clear_url_caches
+
+from restmore.crud import DjangoModelResource
+from restmore.normalizer import normalize_data, normalize_model_instance, get_field_plan
+
+APP_LABEL = 'restmore'
+
+
+def natural_key(self):
+    return (self.name,)
+
+
+def make_models(width, depth):
+    '''
+    Returns the item model, its tag model and the chain of parent models, deepest first
+    '''
+    def columns():
+        attrs = {}
+        for index in range(width):
+            if index % 2:
+                attrs['number%s' % index] = models.IntegerField(default=index)
+            else:
+                attrs['text%s' % index] = models.CharField(max_length=64, default='value')
+        return attrs
+
+    def make(model_name, attrs):
+        attrs.update(__module__=__name__, Meta=type('Meta', (), {'app_label': APP_LABEL}))
+        return type(model_name, (models.Model,), attrs)
+
+    chain = []
+    parent = None
+    for level in range(depth):
+        attrs = columns()
+        attrs.update(name=models.CharField(max_length=64), natural_key=natural_key)
+        if parent is not None:
+            attrs['parent'] = models.ForeignKey(parent, on_delete=models.CASCADE)
+        parent = make('BenchLevel%s' % level, attrs)
+        chain.append(parent)
+    tag = make('BenchTag', {'name': models.CharField(max_length=64), 'natural_key': natural_key})
+    attrs = columns()
+    attrs['tags'] = models.ManyToManyField(tag, blank=True)
+    if parent is not None:
+        attrs['parent'] = models.ForeignKey(parent, on_delete=models.CASCADE)
+    item = make('BenchItem', attrs)
+    with connection.schema_editor() as editor:
+        for model in chain + [tag, item]:
+            editor.create_model(model)
+    return item, tag, chain
+
+
+def populate(item, tag, chain, rows):
+    parent = None
+    for model in chain:
+        kwargs = {'parent': parent} if parent is not None else {}
+        parent = model.objects.create(name='%s-root' % model.__name__, **kwargs)
+    tags = [tag.objects.create(name='tag%s' % index) for index in range(3)]
+    make_items(item, parent, rows)
+    for instance in item.objects.all():
+        instance.tags.set(tags)
+    return parent
+
+
+def make_items(item, parent, rows):
+    kwargs = {'parent': parent} if parent is not None else {}
+    item.objects.bulk_create([item(**kwargs) for index in range(rows)])
+    return list(item.objects.order_by('-pk').values_list('pk', flat=True)[:rows])
+
+
+def make_resource(item, superuser):
+    class BenchResource(DjangoModelResource):
+        model = item
+        exclude_fields = ['tags']
+
+        def get_identity(self):
+            return superuser
+
+        def is_debug(self):
+            return True
+
+    return BenchResource
+
+
+def measure(func, setup=None, number=20, repeat=5):
+    '''
+    Best of `repeat` averages of `number` calls, `setup` runs untimed before each call
+    '''
+    best = None
+    for attempt in range(repeat):
+        elapsed = 0.0
+        for call in range(number):
+            argument = setup() if setup else None
+            start = time.perf_counter()
+            func(argument)
+            elapsed += time.perf_counter() - start
+        average = elapsed / number
+        best = average if best is None else min(best, average)
+    return best
+
+
+def count_queries(func, setup=None):
+    argument = setup() if setup else None
+    with CaptureQueriesContext(connection) as context:
+        func(argument)
+    return len(context.captured_queries)
+
+
+def form_data(item, parent, width):
+    data = {}
+    for index in range(width):
+        if index % 2:
+            data['number%s' % index] = index * 2
+        else:
+            data['text%s' % index] = 'changed'
+    if parent is not None:
+        data['parent'] = parent.pk
+    return data
+
+
+def run(width=10, depth=2, rows=50, number=20, repeat=5):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    item, tag, chain = make_models(width, depth)
+    parent = populate(item, tag, chain, rows)
+    superuser = User.objects.create_superuser('bench', 'bench@domain.com', 'bench')
+    resource = make_resource(item, superuser)
+
+    urls = types.ModuleType('benchmark_urls')
+    urls.urlpatterns = list(resource.urls())
+    client = Client()
+    factory = RequestFactory()
+    select_related, prefetch_related = get_field_plan(item).get_relations()
+    instances = list(item.objects.select_related(*select_related).prefetch_related(*prefetch_related))
+    plain = [{'text%s' % index: 'value', 'number%s' % index: index, 'nested': {'values': list(range(5))}}
+        for index in range(rows)]
+    detail_pk = instances[0].pk
+    body = json.dumps(form_data(item, parent, width))
+
+    def negotiate(request):
+        view = resource()
+        view.request = request
+        view.make_serializer()
+
+    def delete_setup():
+        return make_items(item, parent, 10)
+
+    benchmarks = [
+        ('normalize_data', lambda arg: normalize_data(plain), None, False),
+        ('normalize_model_instance', lambda arg: [normalize_model_instance(obj) for obj in instances], None, False),
+        ('make_serializer', negotiate, lambda: factory.get('/', HTTP_ACCEPT='application/json'), False),
+        ('list', lambda arg: client.get('/'), None, True),
+        ('detail', lambda arg: client.get('/%s/' % detail_pk), None, True),
+        ('create', lambda arg: client.post('/', body, 'application/json'), None, True),
+        ('update', lambda arg: client.put('/%s/' % detail_pk, body, 'application/json'), None, True),
+        ('delete_list', lambda arg: client.delete('/?' + '&'.join('pk=%s' % pk for pk in arg)), delete_setup, True),
+    ]
+    results = {}
+    with override_settings(ROOT_URLCONF=urls, DEBUG=False):
+        clear_url_caches()
+        for name, func, setup, endpoint in benchmarks:
+            if endpoint:
+                response = func(setup() if setup else None)
+                assert response.status_code < 300, (name, response.status_code, response.content[:500])
+            results[name] = {
+                'seconds': measure(func, setup, number, repeat),
+                'queries': count_queries(func, setup),
+            }
+        clear_url_caches()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Returns the regressions against a baseline as readable strings
+    '''
+    regressions = []
+    for name, previous in sorted(baseline.items()):
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions.append('%s: %.3fms, baseline %.3fms' % (name,
+                current['seconds'] * 1e3, previous['seconds'] * 1e3))
+        if current['queries'] > previous['queries']:
+            regressions.append('%s: %s queries, baseline %s' % (name, current['queries'], previous['queries']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=10, help='columns per synthetic model')
+    parser.add_argument('--depth', type=int, default=2, help='length of the foreign key chain')
+    parser.add_argument('--rows', type=int, default=50, help='rows in the item table')
+    parser.add_argument('--number', type=int, default=20, help='calls per timing')
+    parser.add_argument('--repeat', type=int, default=5, help='timings per benchmark, the best is kept')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a JSON file written by --output')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    config = {'width': args.width, 'depth': args.depth, 'rows': args.rows}
+    results = run(args.width, args.depth, args.rows, args.number, args.repeat)
+    for name, result in results.items():
+        print('%-26s %10.3f ms %4s queries' % (name, result['seconds'] * 1e3, result['queries']))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump({'config': config, 'results': results}, handle, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if baseline.get('config') != config:
+            print('CONFIG MISMATCH baseline was recorded with %s, not %s' % (baseline.get('config'), config))
+            return 2
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
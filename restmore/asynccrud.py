@@ -0,0 +1,189 @@
+from contextlib import ExitStack
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page, EmptyPage, PageNotAnInteger
+from django.http import HttpResponse
+from django.db.models import Count, Max
+
+from restless.constants import OK
+from restless.exceptions import MethodNotImplemented, Unauthorized
+
+from .compat import aget, aaggregate, alist
+from .crud import DjangoModelResource
+from .debug import QueryRecorder
+from .pagination import CursorPaginator, InvalidCursor
+from .presentors import StatusException
+from .timing import PhaseTimer
+
+
+class AsyncDjangoModelResource(DjangoModelResource):
+    '''
+    DjangoModelResource for ASGI: reads use the async ORM while identity,
+    permission checks, building querysets (`get_queryset` may use the ORM),
+    request parsing, form writes and normalization (which may touch lazy
+    relations) run in a thread. List responses are not streamed.
+    '''
+    @classmethod
+    def as_view(cls, view_type, *init_args, **init_kwargs):
+        async def _wrapper(request, *args, **kwargs):
+            inst = cls(*init_args, **init_kwargs)
+            inst.request = request
+            return await inst.handle(view_type, *args, **kwargs)
+        #csrf_exempt would hide the coroutine from django before 5.0
+        _wrapper.csrf_exempt = True
+        return _wrapper
+
+    @classmethod
+    def as_list(cls, *init_args, **init_kwargs):
+        return cls.as_view('list', *init_args, **init_kwargs)
+
+    @classmethod
+    def as_detail(cls, *init_args, **init_kwargs):
+        return cls.as_view('detail', *init_args, **init_kwargs)
+
+    def is_streaming(self):
+        return False
+
+    def load_identity(self):
+        identity = self.get_identity()
+        #evaluate a lazy request.user here rather then in the event loop
+        getattr(identity, 'pk', None)
+        return identity
+
+    async def handle(self, endpoint, *args, **kwargs):
+        '''
+        `ahandle` checked against the query budget and timed, as QueryBudgetMixin
+        and TimingMixin do for the sync chain
+        '''
+        recorder = QueryRecorder() if self.is_query_checked() else None
+        timed = self.is_timed()
+        if timed:
+            self.timer = PhaseTimer()
+        contexts = ExitStack()
+
+        def record():
+            #connections are per thread, wrap the ones of the thread sync_to_async queries from
+            if recorder is not None:
+                contexts.enter_context(recorder)
+            if timed:
+                contexts.enter_context(self.timer.record_queries())
+
+        await sync_to_async(record)()
+        try:
+            with self.timer.phase('view'):
+                response = await self.ahandle(endpoint, *args, **kwargs)
+        finally:
+            await sync_to_async(contexts.close)()
+        if timed:
+            self.finish_timing(response)
+        if recorder is not None:
+            self.check_request_queries(endpoint, recorder.queries)
+        return response
+
+    async def ahandle(self, endpoint, *args, **kwargs):
+        '''
+        The AuthorizationMixin -> PresentorResourceMixin -> Resource.handle chain, awaited
+        '''
+        with self.timer.phase('authorize'):
+            self.identity = await sync_to_async(self.load_identity)()
+            view_method_name = self.http_methods.get(endpoint, {}).get(self.request_method(), endpoint)
+            self.authorization = self.make_authorization(self.identity, view_method_name)
+
+        with self.timer.phase('negotiate'):
+            try:
+                self.serializer = self.make_serializer()
+            except StatusException as error:
+                return HttpResponse(error.args[0], status=error.status)
+            try:
+                self.presentor = self.get_presentor()
+            except KeyError:
+                return HttpResponse('Invalid Accepts', status=406)
+
+        self.endpoint = endpoint
+        method = self.request_method()
+        try:
+            if not method in self.http_methods.get(endpoint, {}):
+                raise MethodNotImplemented(
+                    "Unsupported method '{}' for {} endpoint.".format(method, endpoint))
+            if not await sync_to_async(self.is_authenticated)():
+                raise Unauthorized()
+            #multipart bodies are parsed into temporary files
+            self.data = await sync_to_async(self.deserialize)(method, endpoint, self.request_body())
+            view_method = getattr(self, self.http_methods[endpoint][method])
+            data = await view_method(*args, **kwargs)
+            serialized = await sync_to_async(self.serialize)(method, endpoint, data)
+        except Exception as err:
+            return self.handle_error(err)
+
+        status = self.status_map.get(self.http_methods[endpoint][method], OK)
+        response = await sync_to_async(self.build_response)(serialized, status=status)
+        if self.response_cache is not None and method != 'GET' and response.status_code < 400:
+            await sync_to_async(self.response_cache.invalidate)(self.model)
+        return response
+
+    async def acheck_modified(self, queryset, single=False):
+        if not (self.modified_field and self.is_conditional()):
+            return
+        aggregate = await aaggregate(queryset, last_modified=Max(self.modified_field), count=Count('pk'))
+        self.check_conditions(*self.get_modified_validators(aggregate, single))
+
+    async def aget_page(self):
+        paginator = await sync_to_async(self.get_paginator)()
+        if isinstance(paginator, CursorPaginator):
+            return await paginator.apage(self.request.GET.get('cursor'))
+        #fill in the paginator's cached count so validation does not query
+        count, paginator.count_method = await paginator.count_strategy.acount(paginator.object_list)
+        paginator.count = count
+        number = paginator.validate_number(self.request.GET.get('page', 1))
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= count:
+            top = count
+        return Page(await alist(paginator.object_list[bottom:top]), number, paginator)
+
+    async def list(self):
+        if self.is_batch():
+            return await self.detail_list()
+        queryset = await sync_to_async(self.get_queryset)()
+        await self.acheck_modified(await sync_to_async(self.filter_queryset)(queryset))
+        await sync_to_async(self.check_response_cache)()
+        try:
+            self.page = await self.aget_page()
+            return self.page
+        except InvalidCursor as exception:
+            return self.build_status_response(str(exception), status=400)
+        except PageNotAnInteger as exception:
+            return self.build_status_response(str(exception), status=400)
+        except EmptyPage as exception:
+            return self.build_status_response(str(exception), status=410)
+
+    async def detail(self, pk):
+        queryset = await sync_to_async(self.get_queryset)()
+        await self.acheck_modified(queryset.filter(pk=pk), single=True)
+        await sync_to_async(self.check_response_cache)()
+        try:
+            return await aget(await sync_to_async(self.shape_queryset)(queryset), pk=pk)
+        except self.model.DoesNotExist as exception:
+            return self.build_status_response(str(exception), status=404)
+
+    async def export(self):
+        #the rows would be read while the response streams, inside the event loop
+        raise MethodNotImplemented('Exports are not available from an AsyncDjangoModelResource')
+
+    async def detail_list(self):
+        return await sync_to_async(super(AsyncDjangoModelResource, self).detail_list)()
+
+    #writes need transaction.atomic and forms, neither of which is async
+    async def create(self):
+        return await sync_to_async(super(AsyncDjangoModelResource, self).create)()
+
+    async def update(self, pk):
+        return await sync_to_async(super(AsyncDjangoModelResource, self).update)(pk)
+
+    async def delete(self, pk):
+        return await sync_to_async(super(AsyncDjangoModelResource, self).delete)(pk)
+
+    async def update_list(self):
+        return await sync_to_async(super(AsyncDjangoModelResource, self).update_list)()
+
+    async def delete_list(self):
+        return await sync_to_async(super(AsyncDjangoModelResource, self).delete_list)()
@@ -0,0 +1,94 @@
+import hashlib
+import uuid
+from django.core.cache import caches
+from django.db.models import signals
+from django.http import HttpResponse
+
+
+class ResponseCache(object):
+    '''
+    Caches serialized responses per model, every save or delete of the model
+    starts a new generation of keys so stale entries are never read again
+    '''
+    def __init__(self, timeout=60, cache_alias='default', key_prefix='restmore.response'):
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+        self.connected = set()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def generation_key(self, model):
+        return '%s.%s.generation' % (self.key_prefix, model._meta.label_lower)
+
+    def get_generation(self, model):
+        key = self.generation_key(model)
+        generation = self.cache.get(key)
+        if generation is None:
+            self.cache.add(key, uuid.uuid4().hex, None)
+            generation = self.cache.get(key)
+        return generation
+
+    def invalidate(self, model):
+        #a random token rather then a counter, an evicted counter would restart at old values
+        self.cache.set(self.generation_key(model), uuid.uuid4().hex, None)
+
+    def connect(self, model):
+        '''
+        Invalidate on post_save / post_delete of the model and changes to its many to many relations
+        '''
+        if model in self.connected:
+            return
+        self.connected.add(model)
+        receiver = lambda sender, **kwargs: self.invalidate(model)
+        for signal, sender in self.get_senders(model):
+            signal.connect(receiver, sender=sender, weak=False, dispatch_uid=self.dispatch_uid(model))
+
+    def disconnect(self, model):
+        self.connected.discard(model)
+        for signal, sender in self.get_senders(model):
+            signal.disconnect(sender=sender, dispatch_uid=self.dispatch_uid(model))
+
+    def get_senders(self, model):
+        senders = [(signals.post_save, model), (signals.post_delete, model)]
+        for field in model._meta.many_to_many:
+            senders.append((signals.m2m_changed, field.remote_field.through))
+        return senders
+
+    def dispatch_uid(self, model):
+        return '%s.%s.%s' % (self.key_prefix, model._meta.label_lower, id(self))
+
+    def make_key(self, model, *parts):
+        digest = hashlib.md5(repr(parts).encode('utf8')).hexdigest()
+        return '%s.%s.%s.%s' % (self.key_prefix, model._meta.label_lower, self.get_generation(model), digest)
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        content, content_type, status, headers = entry
+        response = HttpResponse(content, content_type=content_type, status=status)
+        for header, value in headers:
+            response[header] = value
+        return response
+
+    def get_content(self, key):
+        '''
+        Returns just the cached body, or None
+        '''
+        entry = self.cache.get(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key, response):
+        headers = [(header, response[header]) for header in ('ETag', 'Last-Modified') if response.has_header(header)]
+        entry = (response.content, response['Content-Type'], response.status_code, headers)
+        self.cache.set(key, entry, self.timeout)
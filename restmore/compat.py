@@ -0,0 +1,28 @@
+'''
+Async ORM entry points, native on django 4.1+ and run in a thread before that
+'''
+from asgiref.sync import sync_to_async
+
+
+async def aget(queryset, **kwargs):
+    if hasattr(queryset, 'aget'):
+        return await queryset.aget(**kwargs)
+    return await sync_to_async(queryset.get)(**kwargs)
+
+
+async def acount(queryset):
+    if hasattr(queryset, 'acount'):
+        return await queryset.acount()
+    return await sync_to_async(queryset.count)()
+
+
+async def aaggregate(queryset, **kwargs):
+    if hasattr(queryset, 'aaggregate'):
+        return await queryset.aaggregate(**kwargs)
+    return await sync_to_async(queryset.aggregate)(**kwargs)
+
+
+async def alist(queryset):
+    if hasattr(queryset, '__aiter__'):
+        return [obj async for obj in queryset]
+    return await sync_to_async(list)(queryset)
@@ -1,54 +1,453 @@
-from django.db import transaction
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections, router, transaction
+from django.utils.cache import get_conditional_response
+from django.db.models import QuerySet, CASCADE, DO_NOTHING, Count, Max, prefetch_related_objects, signals
+from django.core.paginator import Page, EmptyPage, PageNotAnInteger
 from django.forms.models import modelform_factory
+from django.urls import re_path
 
+from collections import Counter
 from functools import lru_cache
+import calendar
+import hashlib
+from itertools import islice
+import logging
 
 from restless.dj import DjangoResource
 
+from .debug import QueryBudgetMixin
+from .filters import LOOKUPS, FilterError, clean_lookup, get_indexed_fields
 from .forms import DjangoFormMixin
+from .normalizer import get_field_plan, merge_field_masks
+from .pagination import CursorPaginator, CursorPage, InvalidCursor, CountingPaginator, ExactCount, \
+    get_cursor_fields
 from .permissions import ModelAuthorizationMixin
-from .presentors import PresentorResourceMixin
+from .presentors import PresentorResourceMixin, ShortCircuit
+from .timing import TimingMixin
 
 
-class DjangoModelResource(ModelAuthorizationMixin, DjangoFormMixin, PresentorResourceMixin, DjangoResource):
+logger = logging.getLogger('restmore.filters')
+export_logger = logging.getLogger('restmore.export')
+
+#(resource class, fields, exclude) -> generated ModelForm class
+_form_classes = {}
+
+
+class DjangoModelResource(QueryBudgetMixin, TimingMixin, ModelAuthorizationMixin, DjangoFormMixin, PresentorResourceMixin, DjangoResource):
     '''
     A restless DjangoResource with ponies
     '''
     model = None
+    http_methods = dict(DjangoResource.http_methods, export={'GET': 'export'})
     paginate_by = 50
-    #TODO filter_by
+    #opt-in: encode list responses row by row from a chunked cursor
+    stream_list = False
+    stream_chunk_size = 100
+    #opt-in: `GET export/` streams every row of the filtered list, ie as NDJSON or CSV.
+    #the rows are read as the body streams, after `handle` has returned, so query budgets
+    #and timings do not cover them and a failure can no longer change the status:
+    #NDJSON and CSV bodies then end with an error line, JSON bodies are left unterminated
+    exportable = False
+    #rows read per round trip of an export's server side cursor
+    export_chunk_size = 2000
+    #keyset pagination on these ordering fields, ie `('-date_joined',)`, instead of page numbers
+    cursor_ordering = None
+    #how page totals are counted: ExactCount(), CachedCount(timeout) or EstimatedCount(threshold)
+    count_strategy = ExactCount()
+    #field names clients may filter on with `?name=`, `?name__in=a,b`, `?name__range=a,b` & `?name__isnull=true`
+    filter_by = None
+    #field names clients may sort by with `?ordering=-name,other`
+    order_by = None
+    #filters & orderings on columns that lead no index are 'reject'ed, 'warn'ed about or 'allow'ed
+    unindexed_filters = 'reject'
+    #query parameters that are never filters
+    reserved_parameters = ('page', 'paginate_by', 'cursor', 'fields', 'ordering', 'mode')
+    #most pks a batch detail request (`?mode=batch&pk=1&pk=2`) may ask for
+    max_batch_size = 200
     #these modify autoform
     fields = None
     exclude_fields = None
-    #TODO fields, exclude_fields to shape preparer
+    #field names clients may select with `?fields=a,b,c`, defaults to every serialized field
+    sparse_fields = None
+    #relations to load up front, None plans them from the serialized fields
+    select_related = None
+    prefetch_related = None
+    #rows per INSERT / UPDATE statement for create_list and update_list
+    bulk_batch_size = 500
+    #opt-in: delete_list issues raw DELETEs when no signals or python side cascades are involved
+    fast_delete = False
+    #pks per DELETE statement
+    delete_chunk_size = 1000
+    #a DateTimeField touched on every change (ie `auto_now=True`), lets conditional GETs skip the query
+    modified_field = None
+    #opt-in response caching, ie `response_cache = ResponseCache(timeout=60)`
+    response_cache = None
+
+    def __init_subclass__(cls, **kwargs):
+        super(DjangoModelResource, cls).__init_subclass__(**kwargs)
+        if cls.model is not None and cls.cursor_ordering:
+            #fail at import rather then on the first request
+            get_cursor_fields(cls.model, cls.cursor_ordering)
 
     def get_queryset(self):
         queryset = self.model.objects.all()
         return self.authorization.process_queryset(queryset)
 
+    def get_filters(self):
+        '''
+        Returns the queryset filter keyword arguments from the query string
+        '''
+        filters = {}
+        if not self.filter_by:
+            return filters
+        allowed = set(self.filter_by)
+        opts = self.model._meta
+        for key, values in self.request.GET.lists():
+            if key in self.reserved_parameters:
+                continue
+            name, _, lookup = key.partition('__')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                #not meant as a filter
+                continue
+            if name not in allowed or self.is_masked(field):
+                self.build_status_response('Filtering on %s is not allowed' % name, status=400)
+            lookup = lookup or 'exact'
+            if lookup not in LOOKUPS:
+                self.build_status_response('Unsupported lookup: %s' % key, status=400)
+            self.check_indexed(field)
+            try:
+                filters['%s__%s' % (name, lookup)] = clean_lookup(field, lookup, values)
+            except FilterError as error:
+                self.build_status_response(str(error), status=400)
+        return filters
+
+    def get_ordering(self):
+        '''
+        Returns the requested ordering or None
+        '''
+        value = self.request.GET.get('ordering')
+        if not value or not self.order_by:
+            return None
+        if self.cursor_ordering:
+            self.build_status_response('Ordering is fixed by cursor pagination', status=400)
+        ordering = [order.strip() for order in value.split(',') if order.strip()]
+        opts = self.model._meta
+        for order in ordering:
+            name = order.lstrip('-')
+            if name == 'pk':
+                continue
+            field = opts.get_field(name)
+            if name not in self.order_by or self.is_masked(field):
+                self.build_status_response('Ordering by %s is not allowed' % name, status=400)
+            self.check_indexed(field)
+        if not set(order.lstrip('-') for order in ordering) & set(['pk', opts.pk.name]):
+            #a unique tiebreaker keeps pages stable
+            ordering.append('pk')
+        return ordering
+
+    def is_masked(self, field):
+        '''
+        Whether the authorization hides `field` from this identity, such fields may not be
+        filtered or ordered by since the results would give their values away
+        '''
+        masks = self.authorization.get_field_masks()
+        if not masks or self.model not in masks or field.primary_key:
+            return False
+        return field.name not in masks[self.model]
+
+    def check_indexed(self, field):
+        if self.unindexed_filters == 'allow' or field.name in get_indexed_fields(self.model):
+            return
+        message = '%s is not indexed' % field.name
+        if self.unindexed_filters == 'warn':
+            logger.warning('%s: %s', type(self).__name__, message)
+        else:
+            self.build_status_response(message + ', it may not be filtered or ordered by', status=400)
+
+    def filter_queryset(self, queryset):
+        '''
+        Applies the filters and ordering requested by the client to a list queryset
+        '''
+        if not (self.filter_by or self.order_by):
+            return queryset
+        if not hasattr(self, '_list_filters'):
+            self._list_filters = self.get_filters(), self.get_ordering()
+        filters, ordering = self._list_filters
+        if filters:
+            queryset = queryset.filter(**filters)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_allowed_fields(self):
+        if self.sparse_fields is not None:
+            allowed = frozenset(self.sparse_fields)
+        else:
+            allowed = frozenset(get_field_plan(self.model._meta.concrete_model).names)
+        #fields hidden from this identity are as good as unknown
+        masks = self.authorization.get_field_masks()
+        if masks and self.model in masks:
+            allowed &= masks[self.model]
+        return allowed
+
+    def get_requested_fields(self):
+        '''
+        Returns the field names selected with `?fields=`, or None for all fields
+        '''
+        value = self.request.GET.get('fields')
+        if not value:
+            return None
+        requested = frozenset(name.strip() for name in value.split(',') if name.strip())
+        unknown = requested - self.get_allowed_fields()
+        if unknown:
+            self.build_status_response('Unknown fields: ' + ', '.join(sorted(unknown)), status=400)
+        return requested
+
+    def get_visible_fields(self):
+        if not hasattr(self, '_visible_fields'):
+            requested = self.get_requested_fields()
+            masks = self.authorization.get_field_masks()
+            if masks and self.model in masks:
+                #the authorization's mask also decides which columns are fetched
+                requested = self.get_allowed_fields() if requested is None else requested
+            self._visible_fields = merge_field_masks(masks, requested is not None and {self.model: requested})
+        return self._visible_fields
+
+    def shape_queryset(self, queryset):
+        '''
+        Narrow a read queryset down to the columns that will be serialized
+        '''
+        fields = self.get_visible_fields()
+        if fields and self.model in fields:
+            opts = self.model._meta
+            columns = [name for name in fields[self.model]
+                if not opts.get_field(name).many_to_many]
+            #keep the keys a cursor is built from
+            columns.extend(order.lstrip('-') for order in self.cursor_ordering or ())
+            queryset = queryset.only(*columns or ['pk'])
+        select_related, prefetch_related = self.get_relation_plan()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+    def get_relation_plan(self):
+        '''
+        Returns the `(select_related, prefetch_related)` lookups for reads
+        '''
+        fields = self.get_visible_fields()
+        plan = get_field_plan(self.model._meta.concrete_model, fields and fields.get(self.model))
+        select_related, prefetch_related = plan.get_relations()
+        if self.select_related is not None:
+            select_related = self.select_related
+        if self.prefetch_related is not None:
+            prefetch_related = self.prefetch_related
+        return select_related, prefetch_related
+
+    @classmethod
+    def build_form_class(cls, fields=None, exclude=None):
+        '''
+        Returns the autoform for a field set, generated once per resource class
+        '''
+        fields = tuple(fields) if isinstance(fields, (list, tuple)) else fields
+        exclude = tuple(exclude) if exclude is not None else None
+        key = (cls, fields, exclude)
+        try:
+            return _form_classes[key]
+        except KeyError:
+            pass
+        form_class = modelform_factory(model=cls.model,
+            fields=list(fields) if isinstance(fields, tuple) else fields,
+            exclude=list(exclude) if exclude is not None else None)
+        _form_classes[key] = form_class
+        return form_class
+
     def get_form_class(self):
         if self.form_class:
             return self.form_class
-        #TODO authorization may want to modify our form
-        return modelform_factory(model=self.model, fields=self.fields, exclude=self.exclude_fields)
+        #authorization may want to modify our form
+        fields, exclude = self.authorization.process_form_fields(self.fields, self.exclude_fields)
+        return self.build_form_class(fields, exclude)
+
+    @classmethod
+    def urls(cls, name_prefix=None):
+        #build the default autoform up front so writes skip class construction
+        if cls.model is not None and cls.form_class is None and \
+                (cls.fields is not None or cls.exclude_fields is not None):
+            cls.build_form_class(cls.fields, cls.exclude_fields)
+        urls = super(DjangoModelResource, cls).urls(name_prefix)
+        if cls.exportable:
+            #ahead of the detail pattern, which would take `export` for a pk
+            urls.insert(1, re_path(r'^export/$', cls.as_view('export'),
+                name=cls.build_url_name('export', name_prefix)))
+        return urls
 
     def url_for(self, obj):
         #TODO i'm sure we can come up with a smarter default
         return obj.get_absolute_url()
 
-    #@lru_cache
     def get_paginator(self):
-        queryset = self.get_queryset()
-        return Paginator(queryset, self.request.GET.get('paginate_by', self.paginate_by))
+        queryset = self.shape_queryset(self.filter_queryset(self.get_queryset()))
+        per_page = self.request.GET.get('paginate_by', self.paginate_by)
+        if self.cursor_ordering:
+            return CursorPaginator(queryset, self.cursor_ordering, per_page)
+        return CountingPaginator(queryset, per_page, count_strategy=self.count_strategy)
 
     def get_page(self):
         paginator = self.get_paginator()
+        if isinstance(paginator, CursorPaginator):
+            return paginator.page(self.request.GET.get('cursor'))
         return paginator.page(self.request.GET.get('page', 1))
 
+    def wrap_list_response(self, data):
+        page = getattr(self, 'page', None)
+        if isinstance(page, CursorPage):
+            return {
+                'objects': data,
+                'pagination': {
+                    'next_cursor': page.next_cursor,
+                    'previous_cursor': page.previous_cursor,
+                    'per_page': page.paginator.per_page,
+                },
+            }
+        response = super(DjangoModelResource, self).wrap_list_response(data)
+        if getattr(self, 'batch_missing', None) is not None:
+            response['missing'] = self.prepare(self.batch_missing)
+        if getattr(self, 'bulk_errors', None):
+            response['errors'] = self.prepare(self.bulk_errors)
+        if isinstance(getattr(page, 'paginator', None), CountingPaginator):
+            response['pagination']['count_method'] = page.paginator.count_method
+        return response
+
+    def make_etag(self, *parts):
+        #the same rows may be presented differently
+        accept = self.request.META.get('HTTP_ACCEPT', '')
+        key = repr((self.request.get_full_path(), accept) + parts)
+        return hashlib.md5(key.encode('utf8')).hexdigest()
+
+    def check_modified(self, queryset, single=False):
+        '''
+        Answer a conditional GET from `MAX(modified_field)` and the row count
+        '''
+        if not (self.modified_field and self.is_conditional()):
+            return
+        aggregate = queryset.aggregate(last_modified=Max(self.modified_field), count=Count('pk'))
+        self.check_conditions(*self.get_modified_validators(aggregate, single))
+
+    def get_modified_validators(self, aggregate, single=False):
+        '''
+        Returns the `(etag, last_modified)` of a `check_modified` aggregate. Deleting
+        a row other then the newest leaves `MAX(modified_field)` as it was, so only
+        a single row gets a Last-Modified, collections rely on the ETag's count
+        '''
+        last_modified = aggregate['last_modified']
+        etag = self.make_etag(last_modified and last_modified.isoformat(), aggregate['count'])
+        if not single or last_modified is None:
+            return etag, None
+        return etag, calendar.timegm(last_modified.utctimetuple())
+
+    def check_response_cache(self):
+        '''
+        Serve a GET from the response cache, or remember the key to store the response under
+        '''
+        if self.response_cache is None or self.request.method != 'GET':
+            return
+        self.response_cache.connect(self.model)
+        self.response_cache_key = self.get_response_cache_key(self.presentor.get_response_type(),
+            type(self.serializer.serializer))
+        response = self.response_cache.get(self.response_cache_key)
+        if response is not None:
+            if self.is_conditional() and response.has_header('ETag'):
+                response = get_conditional_response(self.request, etag=response['ETag'], response=response)
+            raise ShortCircuit(response)
+        if self.serializer.embeds_json:
+            from .settings import SERIALIZERS
+            #the JSON body of the same response, if it was cached
+            key = self.get_response_cache_key(self.presentor.get_response_type(), SERIALIZERS['application/json'])
+            content = self.response_cache.get_content(key)
+            self.cached_jsondata = content.decode('utf-8') if content is not None else None
+
+    def get_response_cache_key(self, response_type, serializer):
+        return self.response_cache.make_key(self.model,
+            self.endpoint,
+            self.request.path,
+            sorted(self.request.GET.lists()),
+            response_type,
+            '%s.%s' % (serializer.__module__, serializer.__name__),
+            self.authorization.get_scope_key())
+
+    def get_jsondata(self):
+        return getattr(self, 'cached_jsondata', None)
+
+    def build_response(self, data, status=200):
+        response = super(DjangoModelResource, self).build_response(data, status)
+        key = getattr(self, 'response_cache_key', None)
+        if key and response.status_code == 200 and not response.streaming:
+            self.response_cache.set(key, response)
+        return response
+
+    def deserialize(self, method, endpoint, body):
+        #reject a bad `?fields=` before the view writes anything
+        self.get_visible_fields()
+        return super(DjangoModelResource, self).deserialize(method, endpoint, body)
+
+    def handle(self, endpoint, *args, **kwargs):
+        response = super(DjangoModelResource, self).handle(endpoint, *args, **kwargs)
+        if self.response_cache is not None and self.request.method != 'GET' and response.status_code < 400:
+            #bulk writes do not send model signals
+            self.response_cache.invalidate(self.model)
+        return response
+
+    def is_batch(self):
+        return self.request.GET.get('mode') == 'batch'
+
+    def get_batch_pks(self):
+        '''
+        Returns the distinct pks of a batch request in the order they were asked for
+        '''
+        pk_field = self.model._meta.pk
+        pks, seen = [], set()
+        for value in self.request.GET.getlist('pk'):
+            for item in value.split(','):
+                try:
+                    pk = pk_field.to_python(item.strip())
+                except ValidationError:
+                    self.build_status_response('Invalid pk: %s' % item, status=400)
+                if pk not in seen:
+                    seen.add(pk)
+                    pks.append(pk)
+        if not pks:
+            self.build_status_response('Batch requests need at least one pk', status=400)
+        if len(pks) > self.max_batch_size:
+            self.build_status_response('Batch requests are limited to %s pks' % self.max_batch_size, status=400)
+        return pks
+
+    def detail_list(self):
+        '''
+        Many details in one query, objects keep the requested order and pks that
+        do not exist (or are not visible to this identity) are listed under `missing`
+        '''
+        pks = self.get_batch_pks()
+        queryset = self.get_queryset()
+        self.check_modified(queryset.filter(pk__in=pks))
+        self.check_response_cache()
+        found = self.shape_queryset(queryset).in_bulk(pks)
+        self.batch_missing = [pk for pk in pks if pk not in found]
+        return [found[pk] for pk in pks if pk in found]
+
     def list(self):
+        if self.is_batch():
+            return self.detail_list()
+        self.check_modified(self.filter_queryset(self.get_queryset()))
+        self.check_response_cache()
         try:
-            return self.get_page()
+            self.page = self.get_page()
+            return self.page
+        except InvalidCursor as exception:
+            return self.build_status_response(str(exception), status=400)
         except PageNotAnInteger as exception:
             #TODO proper status code?
             return self.build_status_response(str(exception), status=400)
@@ -56,14 +455,100 @@ class DjangoModelResource(ModelAuthorizationMixin, DjangoFormMixin, PresentorRes
             #TODO proper status code?
             return self.build_status_response(str(exception), status=410)
 
+    def is_streaming(self):
+        return self.stream_list and self.serializer.can_stream()
+
+    def iter_rows(self, data, chunk_size=None):
+        '''
+        Iterate a page or queryset without caching the rows
+        '''
+        chunk_size = chunk_size or self.stream_chunk_size
+        if isinstance(data, Page):
+            data = data.object_list
+        if isinstance(data, QuerySet):
+            rows = data.iterator(chunk_size=chunk_size)
+            if data._prefetch_related_lookups:
+                return self.prefetch_chunks(rows, data._prefetch_related_lookups, chunk_size)
+            return rows
+        return iter(data)
+
+    def prefetch_chunks(self, rows, lookups, chunk_size=None):
+        '''
+        iterator() skips prefetch_related, so prefetch each chunk as it is read
+        '''
+        chunk_size = chunk_size or self.stream_chunk_size
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            prefetch_related_objects(chunk, *lookups)
+            for row in chunk:
+                yield row
+            #let the chunk and its prefetched rows go before the next one is read
+            del chunk, row
+
+    def serialize_list(self, data):
+        if isinstance(data, dict):
+            #already wrapped by a bulk write, see update_list
+            return self.serialize_detail(data)
+        if data is None or not getattr(data, 'should_prepare', True) or not self.is_streaming():
+            return super(DjangoModelResource, self).serialize_list(data)
+        rows = self.prepare_rows(self.iter_rows(data))
+        return self.serializer.serialize_stream(self.wrap_list_response(rows))
+
+    def export(self):
+        '''
+        The filtered list in a stable order, unpaginated. serialize_detail streams
+        it from a server side cursor (where the database has them) so memory use
+        stays flat however many rows there are
+        '''
+        if not (self.serializer.can_serialize_rows() or self.serializer.can_stream()):
+            self.build_status_response('Exports are not available as %s' % self.presentor.get_response_type(),
+                status=406)
+        queryset = self.shape_queryset(self.filter_queryset(self.get_queryset()))
+        self.check_modified(queryset)
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return queryset
+
+    def serialize_detail(self, data):
+        if self.endpoint == 'export' and isinstance(data, QuerySet):
+            return self.serialize_export(data)
+        return super(DjangoModelResource, self).serialize_detail(data)
+
+    def serialize_export(self, queryset):
+        rows = self.prepare_rows(self.iter_rows(queryset, self.export_chunk_size))
+        if self.serializer.can_serialize_rows():
+            return self.finish_export(self.serializer.serialize_rows(rows))
+        return self.serializer.serialize_stream({'objects': rows})
+
+    def finish_export(self, chunks):
+        '''
+        Passes the chunks through, a failure part way ends the body with the
+        serializer's error line so clients can tell a truncated export from a complete one
+        '''
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            export_logger.exception('Export of %s failed', self.model._meta.label)
+            line = self.serializer.serialize_error('Export failed before every row was written')
+            if line is None:
+                raise
+            yield line
+
     def detail(self, pk):
+        self.check_modified(self.get_queryset().filter(pk=pk), single=True)
+        self.check_response_cache()
         try:
-            return self.get_queryset().get(pk=pk)
+            return self.shape_queryset(self.get_queryset()).get(pk=pk)
         except self.model.DoesNotExist as exception:
             return self.build_status_response(str(exception), status=404)
 
     @transaction.atomic
     def create(self):
+        if isinstance(self.data, list):
+            return self.create_list()
         form = self.make_form()
         if form.is_valid():
             obj = form.save()
@@ -92,15 +577,154 @@ class DjangoModelResource(ModelAuthorizationMixin, DjangoFormMixin, PresentorRes
         return None
         #return self.build_status_response(None, status=204)#or 410?
 
+    def get_fast_delete_plan(self):
+        '''
+        Returns the `(related_model, field_name)` cascades that can be deleted
+        with raw DELETEs, or None when django's deletion collector is required
+        '''
+        opts = self.model._meta
+        if opts.parents or any(hasattr(field, 'bulk_related_objects') for field in opts.private_fields):
+            return None
+        for signal in (signals.pre_delete, signals.post_delete):
+            if signal.has_listeners(self.model):
+                return None
+        plan = []
+        for related in opts.get_fields(include_hidden=True):
+            if not (related.auto_created and not related.concrete and (related.one_to_one or related.one_to_many)):
+                continue
+            on_delete = related.field.remote_field.on_delete
+            if on_delete is DO_NOTHING:
+                continue
+            related_model = related.related_model
+            related_opts = related_model._meta
+            if on_delete is not CASCADE or related.field.target_field != opts.pk:
+                return None
+            #the cascaded rows must not need a collector of their own
+            if related_opts.parents or any(hasattr(field, 'bulk_related_objects') for field in related_opts.private_fields):
+                return None
+            if signals.pre_delete.has_listeners(related_model) or signals.post_delete.has_listeners(related_model):
+                return None
+            for nested in related_opts.get_fields(include_hidden=True):
+                if (nested.auto_created and not nested.concrete and (nested.one_to_one or nested.one_to_many)
+                        and nested.field.remote_field.on_delete is not DO_NOTHING):
+                    return None
+            plan.append((related_model, related.field.name))
+        return plan
+
+    def fast_delete_chunk(self, queryset, plan):
+        pks = list(queryset.values_list('pk', flat=True))
+        counts = Counter()
+        if not pks:
+            return 0, counts
+        for related_model, field_name in plan:
+            manager = related_model._base_manager
+            #private api, but it is what the collector itself runs for fast deletes
+            deleted = manager.filter(**{field_name + '__in': pks})._raw_delete(queryset.db)
+            if deleted:
+                counts[related_model._meta.label] += deleted
+        deleted = self.model._base_manager.filter(pk__in=pks)._raw_delete(queryset.db)
+        counts[self.model._meta.label] += deleted
+        return sum(counts.values()), counts
+
     @transaction.atomic
     def delete_list(self):
         pks = self.request.GET.getlist('pk')
-        return self.get_queryset().filter(pk__in=pks).delete()
+        queryset = self.get_queryset()
+        plan = self.get_fast_delete_plan() if self.fast_delete else None
+        total, counts = 0, Counter()
+        for start in range(0, len(pks), self.delete_chunk_size):
+            chunk = queryset.filter(pk__in=pks[start:start + self.delete_chunk_size])
+            if plan is None:
+                deleted, per_model = chunk.delete()
+            else:
+                deleted, per_model = self.fast_delete_chunk(chunk, plan)
+            total += deleted
+            counts.update(per_model)
+        return total, dict(counts)
         #return HttpResponseRedirect('./', status=303)
 
-    #TODO
-    '''
+    def get_bulk_update_fields(self, form):
+        opts = self.model._meta
+        names = set(field.name for field in opts.concrete_fields if not field.primary_key)
+        return [name for name in form.fields if name in names]
+
+    def has_m2m_fields(self, form):
+        names = set(field.name for field in self.model._meta.many_to_many)
+        return any(name in names for name in form.fields)
+
+    def validate_list(self, items, instances=None):
+        '''
+        Validates each item with the form class, returns the valid forms and
+        the errors by index
+        '''
+        forms, errors = [], {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {'__all__': ['Expected an object']}
+                continue
+            kwargs = {'data': self.make_form_data(item)}
+            if instances is not None:
+                if instances[index] is None:
+                    errors[index] = {'pk': ['Does not exist']}
+                    continue
+                kwargs['instance'] = instances[index]
+            form = self.make_form(**kwargs)
+            if form.is_valid():
+                forms.append(form)
+            else:
+                errors[index] = self.wrap_validation_error_response(form.errors)
+        return forms, errors
+
+    @transaction.atomic
+    def create_list(self):
+        '''
+        Creates every valid item of an array payload with bulk_create
+        '''
+        forms, self.bulk_errors = self.validate_list(self.data)
+        if self.bulk_errors and not forms:
+            return self.build_validation_error(self.bulk_errors)
+        if forms and (self.has_m2m_fields(forms[0]) or not self.can_bulk_create()):
+            #many to many data needs primary keys, so save one at a time
+            objects = [form.save() for form in forms]
+        else:
+            objects = [form.save(commit=False) for form in forms]
+            objects = self.model._default_manager.bulk_create(objects, batch_size=self.bulk_batch_size)
+        return self.wrap_list_response(objects)
+
+    def can_bulk_create(self):
+        '''
+        bulk_create only sets primary keys where the database returns them (ie
+        PostgreSQL), elsewhere the response would list the created rows without ids
+        '''
+        connection = connections[router.db_for_write(self.model)]
+        return connection.features.can_return_rows_from_bulk_insert
+
     @transaction.atomic
     def update_list(self):
-        pass
-    '''
+        '''
+        Updates every valid item of an array payload, keyed by `pk`, with bulk_update
+        '''
+        pk_field = self.model._meta.pk
+        pks = []
+        for item in self.data:
+            try:
+                pks.append(pk_field.to_python(item.get('pk', item.get(pk_field.name))))
+            except (ValidationError, AttributeError):
+                pks.append(None)
+        keyed = [pk for pk in pks if pk is not None]
+        if len(set(keyed)) != len(keyed):
+            duplicates = sorted(set(pk for pk in keyed if keyed.count(pk) > 1), key=str)
+            return self.build_status_response('Duplicate pks: %s' % ', '.join(map(str, duplicates)), status=400)
+        existing = self.get_queryset().in_bulk(keyed)
+        instances = [existing.get(pk) for pk in pks]
+        forms, self.bulk_errors = self.validate_list(self.data, instances)
+        if self.bulk_errors and not forms:
+            return self.build_validation_error(self.bulk_errors)
+        if forms and self.has_m2m_fields(forms[0]):
+            objects = [form.save() for form in forms]
+        else:
+            objects = [form.save(commit=False) for form in forms]
+            fields = self.get_bulk_update_fields(forms[0]) if forms else None
+            if fields:
+                self.model._default_manager.bulk_update(objects, fields, batch_size=self.bulk_batch_size)
+        return self.wrap_list_response(objects)
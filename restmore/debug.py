@@ -0,0 +1,142 @@
+'''
+Query budgets and N+1 detection for resources, enforced in debug mode
+
+    class MyResource(DjangoModelResource):
+        max_queries = {'list': 4, 'detail': 2}
+        detect_n_plus_one = True
+'''
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from django.apps import apps
+from django.db import connections
+
+logger = logging.getLogger('restmore.queries')
+
+_in_list = re.compile(r'IN \((?:%s, )*%s\)')
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_from = re.compile(r'\bFROM [`"]?(\w+)[`"]?')
+_where = re.compile(r'\bWHERE \(?[`"]?(\w+)[`"]?\.[`"]?(\w+)[`"]?')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_pattern(sql):
+    '''
+    Reduces SQL to its structure, queries that only differ by parameters share a pattern
+    '''
+    return _literals.sub('?', _in_list.sub('IN (...)', sql))
+
+
+def describe_pattern(pattern):
+    '''
+    Returns the model label a pattern selects from and the `model.field` it filters by, when known
+    '''
+    tables = dict((model._meta.db_table, model) for model in apps.get_models(include_auto_created=True))
+    match = _from.search(pattern)
+    model = tables.get(match.group(1)) if match else None
+    field = None
+    match = _where.search(pattern)
+    if match and match.group(1) in tables:
+        owner = tables[match.group(1)]
+        for candidate in owner._meta.concrete_fields:
+            if candidate.column == match.group(2):
+                field = '%s.%s' % (owner._meta.label_lower, candidate.name)
+                break
+    return model and model._meta.label_lower, field
+
+
+class QueryRecorder(object):
+    '''
+    Records the SQL run on every database connection while active
+    '''
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        #a django database execute wrapper
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        return False
+
+
+def find_repeated_queries(queries, threshold):
+    '''
+    Returns `(pattern, count, model, field)` for reads repeated at least `threshold` times
+    '''
+    counts = Counter(query_pattern(sql) for sql in queries if sql.lstrip().upper().startswith('SELECT'))
+    return [(pattern, count) + describe_pattern(pattern)
+        for pattern, count in counts.most_common() if count >= threshold]
+
+
+class QueryBudgetMixin(object):
+    '''
+    Checks the queries a request issues against `max_queries` (an int or a
+    dictionary keyed by view method, ie `list` or `delete_list`) and for N+1
+    patterns. Only active when `is_debug()`, streamed bodies are not covered
+    '''
+    max_queries = None
+    detect_n_plus_one = False
+    #structurally identical reads that count as N+1
+    n_plus_one_threshold = 5
+    #raise QueryBudgetExceeded, otherwise log a warning to `restmore.queries`
+    raise_query_errors = True
+
+    @classmethod
+    def get_query_budget(cls, view_method):
+        if isinstance(cls.max_queries, dict):
+            return cls.max_queries.get(view_method)
+        return cls.max_queries
+
+    @classmethod
+    def check_queries(cls, view_method, queries, detect_n_plus_one=None, max_queries=None):
+        '''
+        Returns descriptions of any budget overrun and N+1 patterns
+        '''
+        if detect_n_plus_one is None:
+            detect_n_plus_one = cls.detect_n_plus_one
+        problems = []
+        budget = cls.get_query_budget(view_method) if max_queries is None else max_queries
+        if budget is not None and len(queries) > budget:
+            problems.append('%s.%s issued %s queries, the budget is %s' % (
+                cls.__name__, view_method, len(queries), budget))
+        if problems or detect_n_plus_one:
+            for pattern, count, model, field in find_repeated_queries(queries, cls.n_plus_one_threshold):
+                problems.append('N+1: %s queries on %s filtered by %s: %s' % (count, model, field, pattern))
+        return problems
+
+    def is_query_checked(self):
+        return (self.max_queries is not None or self.detect_n_plus_one) and self.is_debug()
+
+    def handle(self, endpoint, *args, **kwargs):
+        if not self.is_query_checked():
+            return super(QueryBudgetMixin, self).handle(endpoint, *args, **kwargs)
+        with QueryRecorder() as recorder:
+            response = super(QueryBudgetMixin, self).handle(endpoint, *args, **kwargs)
+        self.check_request_queries(endpoint, recorder.queries)
+        return response
+
+    def check_request_queries(self, endpoint, queries):
+        view_method = self.http_methods.get(endpoint, {}).get(self.request_method(), endpoint)
+        problems = self.check_queries(view_method, queries)
+        if problems:
+            self.report_query_problems(problems)
+
+    def report_query_problems(self, problems):
+        message = '\n'.join(problems)
+        if self.raise_query_errors:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
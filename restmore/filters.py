@@ -0,0 +1,72 @@
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import UniqueConstraint
+
+#lookups clients may use as `?field__lookup=value`, exact is implied by a bare `?field=value`
+LOOKUPS = ('exact', 'in', 'range', 'isnull')
+BOOLEANS = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _leading(names):
+    names = [name for name in names or () if name]
+    return names[0].lstrip('-') if names else None
+
+
+@lru_cache(maxsize=None)
+def get_indexed_fields(model):
+    '''
+    Returns the names of the fields whose column leads a database index,
+    composite indexes only help lookups on their first column
+    '''
+    opts = model._meta
+    indexed = set()
+    for field in opts.concrete_fields:
+        #foreign keys are indexed by default
+        if field.primary_key or field.unique or field.db_index:
+            indexed.add(field.name)
+    leading = [_leading(index.fields) for index in opts.indexes]
+    leading.extend(_leading(fields) for fields in opts.unique_together)
+    leading.extend(_leading(fields) for fields in opts.index_together)
+    leading.extend(_leading(constraint.fields) for constraint in opts.constraints
+        if isinstance(constraint, UniqueConstraint))
+    for name in leading:
+        if name is None:
+            continue
+        try:
+            indexed.add(opts.get_field(name).name)
+        except FieldDoesNotExist:
+            continue
+    return frozenset(indexed)
+
+
+def clean_value(field, value):
+    if field.is_relation:
+        field = field.target_field
+    try:
+        return field.to_python(value)
+    except ValidationError as error:
+        raise FilterError('Invalid value for %s: %s' % (field.name, '; '.join(error.messages)))
+
+
+def clean_lookup(field, lookup, values):
+    '''
+    Converts the raw query parameter values of a lookup to python
+    '''
+    if lookup == 'exact':
+        return clean_value(field, values[-1])
+    if lookup == 'isnull':
+        try:
+            return BOOLEANS[values[-1].lower()]
+        except KeyError:
+            raise FilterError('Invalid value for %s__isnull: %s' % (field.name, values[-1]))
+    #`?f__in=1,2` and `?f__in=1&f__in=2` are both accepted
+    items = [item for value in values for item in value.split(',') if item != '']
+    if lookup == 'range':
+        if len(items) != 2:
+            raise FilterError('%s__range takes two values' % field.name)
+        return tuple(clean_value(field, item) for item in items)
+    return [clean_value(field, item) for item in items]
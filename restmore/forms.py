@@ -1,3 +1,4 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.datastructures import MultiValueDict
 
 class DjangoFormMixin(object):
@@ -9,17 +10,33 @@ class DjangoFormMixin(object):
     def get_form_class(self):
         return self.form_class
 
+    def make_form_data(self, data):
+        #MultiValeuDict to please django forms
+        form_data = MultiValueDict()
+        form_data.update(data)
+        return form_data
+
     def make_form(self, **kwargs):
         #TODO is this correct?
         if 'data' not in kwargs:
-            #MultiValeuDict to please django forms
-            data = MultiValueDict()
-            data.update(self.data)
-            kwargs['data'] = data
+            kwargs['data'] = self.make_form_data(self.data)
         if 'files' not in kwargs:
-            kwargs['files'] = self.request.FILES
+            kwargs['files'] = self.make_form_files(self.data)
         return self.get_form_class()(**kwargs)
 
+    def make_form_files(self, data):
+        '''
+        `request.FILES` plus any uploads parsed along with the data
+        '''
+        files = MultiValueDict()
+        files.update(self.request.FILES)
+        if isinstance(data, MultiValueDict):
+            for key, values in data.lists():
+                uploads = [value for value in values if isinstance(value, UploadedFile)]
+                if uploads and key not in files:
+                    files.setlist(key, uploads)
+        return files
+
     def wrap_validation_error_response(self, validation_errors):
         return validation_errors
 
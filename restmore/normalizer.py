@@ -1,10 +1,10 @@
 import decimal
 import types
+from functools import lru_cache
 from django.core.files import File
-from django.utils.encoding import force_text
+from django.utils.encoding import force_text, is_protected_type
 from django.utils.functional import Promise
 from django.core.paginator import Page
-from django.core.serializers.python import Serializer
 from django.db.models import Model, QuerySet
 from restless.preparers import Preparer
 
@@ -14,78 +14,323 @@ def normalize_queryset(queryset):
         yield entry
 
 
+def _field_getter(field):
+    def getter(instance):
+        value = field.value_from_object(instance)
+        if is_protected_type(value):
+            return value
+        return field.value_to_string(instance)
+    return getter
+
+
+def _fk_getter(field):
+    attname = field.attname
+    def getter(instance):
+        value = getattr(instance, attname)
+        if is_protected_type(value):
+            return value
+        return field.value_to_string(instance)
+    return getter
+
+
+def _m2m_getter(field):
+    name = field.name
+    def getter(instance):
+        if instance.pk is None:
+            #unsaved, ie bulk_create on a backend that does not return ids
+            return []
+        #all() rather then iterator() so prefetched relations are honored
+        return [force_text(related.pk, strings_only=True) for related in getattr(instance, name).all()]
+    return getter
+
+
+class FieldPlan(object):
+    '''
+    Precomputed field getters for a model, mirrors the output of django's
+    python serializer without per instance introspection. Relations are
+    written as pks, `use_natural_keys` has long been ignored by django
+    '''
+    def __init__(self, model, fields=None):
+        self.model = model
+        self.fields = fields
+        self.getters = list(self.compile())
+        self.names = [name for name, getter in self.getters]
+
+    def compile(self):
+        opts = self.model._meta.concrete_model._meta
+        for field in opts.local_fields:
+            if not field.serialize:
+                continue
+            if self.fields is not None and field.name not in self.fields:
+                continue
+            if field.remote_field is None:
+                yield field.name, _field_getter(field)
+            else:
+                yield field.name, _fk_getter(field)
+        for field in opts.many_to_many:
+            if not field.serialize:
+                continue
+            if self.fields is not None and field.name not in self.fields:
+                continue
+            if field.remote_field.through._meta.auto_created:
+                yield field.name, _m2m_getter(field)
+
+    def get_relations(self):
+        '''
+        Returns the select_related and prefetch_related lookups that keep the
+        getters from querying per instance
+        '''
+        select_related, prefetch_related = [], []
+        opts = self.model._meta.concrete_model._meta
+        for name in self.names:
+            field = opts.get_field(name)
+            #foreign keys only read the local id column
+            if field.is_relation and field.many_to_many:
+                prefetch_related.append(name)
+        return select_related, prefetch_related
+
+    def __call__(self, instance):
+        data = {name: getter(instance) for name, getter in self.getters}
+        data['pk'] = force_text(instance.pk, strings_only=True)
+        return data
+
+
+@lru_cache(maxsize=512)
+def get_field_plan(model, fields=None):
+    '''
+    Returns the cached FieldPlan for a model and an optional frozenset of field names,
+    bounded as `?fields=` lets clients ask for any subset
+    '''
+    return FieldPlan(model, fields)
+
+
 def normalize_model_instance(instance):
-    serializer = Serializer()
-    flat_obj = serializer.serialize([instance], use_natural_keys=True)[0]
-    #print("normalized result:", flat_obj)
-    data = flat_obj['fields']
-    if 'pk' in flat_obj:
-        data['pk'] = flat_obj['pk']
-    return data
+    return get_field_plan(instance._meta.concrete_model)(instance)
+
+
+class TransmuterTable(dict):
+    '''
+    A transmuter registry that memoizes type dispatch, any change to the table resets the memo
+    '''
+    max_masked = 128
+
+    def __init__(self, *args, **kwargs):
+        super(TransmuterTable, self).__init__(*args, **kwargs)
+        self._dispatch = {}
+        self._masked = {}
+
+    def invalidate(self):
+        self._dispatch.clear()
+        self._masked.clear()
+
+    def masked(self, fields):
+        '''
+        Returns a derived table that only serializes the given fields, `fields`
+        maps a model to a frozenset of field names
+        '''
+        key = frozenset(fields.items())
+        try:
+            return self._masked[key]
+        except KeyError:
+            pass
+        table = TransmuterTable(self)
+        for model, names in fields.items():
+            table[model] = get_field_plan(model, frozenset(names))
+        if len(self._masked) >= self.max_masked:
+            self._masked.clear()
+        self._masked[key] = table
+        return table
+
+    def __setitem__(self, key, value):
+        super(TransmuterTable, self).__setitem__(key, value)
+        self.invalidate()
+
+    def __delitem__(self, key):
+        super(TransmuterTable, self).__delitem__(key)
+        self.invalidate()
+
+    def clear(self):
+        super(TransmuterTable, self).clear()
+        self.invalidate()
+
+    def pop(self, *args):
+        result = super(TransmuterTable, self).pop(*args)
+        self.invalidate()
+        return result
+
+    def popitem(self):
+        result = super(TransmuterTable, self).popitem()
+        self.invalidate()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super(TransmuterTable, self).setdefault(key, default)
+        self.invalidate()
+        return result
+
+    def update(self, *args, **kwargs):
+        super(TransmuterTable, self).update(*args, **kwargs)
+        self.invalidate()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self):
+        return TransmuterTable(self)
+
+    def resolve(self, cls):
+        '''
+        Returns the encoder registered for `cls` (by type or by name) or None
+        '''
+        try:
+            return self._dispatch[cls]
+        except KeyError:
+            pass
+        encoder = None
+        for subcls in cls.__mro__:
+            encoder = self.get(subcls) or self.get(subcls.__name__)
+            if encoder:
+                while not callable(encoder):  # alias
+                    encoder = self[encoder]
+                break
+        self._dispatch[cls] = encoder or None
+        return encoder or None
+
 
 #default transmuters
 #TODO form.errors
-defaultTransmuters = {
+defaultTransmuters = TransmuterTable({
     File: lambda obj: obj.url if hasattr(obj, 'url') else obj.name,
     Promise: force_text,
     types.GeneratorType: list,
     Page: lambda obj: obj.object_list,
     QuerySet: normalize_queryset,
     Model: normalize_model_instance,
-}
+})
+
+#how a value without a transmuter gets walked, memoized per type
+PRIMITIVE, BYTES, LIST, DICT, SET, ITERABLE, OTHER = range(7)
+_kinds = {}
+
+def classify(cls):
+    try:
+        return _kinds[cls]
+    except KeyError:
+        pass
+    if issubclass(cls, (str, int, float, decimal.Decimal)):
+        kind = PRIMITIVE
+    elif issubclass(cls, bytes):
+        kind = BYTES
+    elif issubclass(cls, list):
+        kind = LIST
+    elif issubclass(cls, dict):
+        kind = DICT
+    elif issubclass(cls, set):
+        kind = SET
+    elif hasattr(cls, '__iter__'):
+        kind = ITERABLE
+    else:
+        kind = OTHER
+    _kinds[cls] = kind
+    return kind
+
 
 def normalize_data(obj, notfound=lambda x: x, enc=defaultTransmuters):
     '''
     Recursively normalizes an object into python primitives
     '''
+    if not isinstance(enc, TransmuterTable):
+        #plain dicts get a throwaway table so at least this walk is memoized
+        enc = TransmuterTable(enc)
+    return _normalize(obj, notfound, enc)
+
+
+def _normalize(obj, notfound, enc):
     #print("normalize_dat:", obj)
-    cls = obj if hasattr(obj, '__mro__') else type(obj)
-    mro = cls.__mro__
-    for subcls in mro:
-        encoder = enc.get(subcls) or enc.get(subcls.__name__)
-        if encoder:
-            while not callable(encoder):  # alias
-                encoder = enc[encoder]
-            return normalize_data(encoder(obj), notfound, enc)
-    if isinstance(obj, (str, int, float, decimal.Decimal)):
+    cls = type(obj)
+    #classes are dispatched by their own mro
+    encoder = enc.resolve(obj if issubclass(cls, type) else cls)
+    if encoder:
+        return _normalize(encoder(obj), notfound, enc)
+    kind = classify(cls)
+    if kind == PRIMITIVE:
         return obj
-    elif isinstance(obj, bytes):
+    elif kind == BYTES:
         #TODO this is not proper
         return obj.decode('utf8')
-    elif isinstance(obj, list):
-        obj = [normalize_data(item, notfound, enc) for item in obj]
-    elif isinstance(obj, dict):
-        obj = dict([(normalize_data(k, notfound, enc), normalize_data(v, notfound, enc))
+    elif kind == LIST:
+        obj = [_normalize(item, notfound, enc) for item in obj]
+    elif kind == DICT:
+        obj = dict([(_normalize(k, notfound, enc), _normalize(v, notfound, enc))
             for k, v in obj.items()])
-    elif isinstance(obj, set):
-        obj = set([normalize_data(item, notfound, enc) for item in obj])
-    elif hasattr(obj, '__iter__'):
-        obj = [normalize_data(item, notfound, enc) for item in obj]
+    elif kind == SET:
+        obj = set([_normalize(item, notfound, enc) for item in obj])
+    elif kind == ITERABLE:
+        obj = [_normalize(item, notfound, enc) for item in obj]
     return notfound(obj)
 
 
+def merge_field_masks(*masks):
+    '''
+    Combines model -> frozenset dictionaries, a model in several keeps only
+    the fields they have in common. None stands for no restriction
+    '''
+    merged = None
+    for mask in masks:
+        if not mask:
+            continue
+        if merged is None:
+            merged = dict(mask)
+            continue
+        for model, names in mask.items():
+            merged[model] = merged[model] & names if model in merged else names
+    return merged
+
+
 class Normalizer(object):
     defaultTransmuter = lambda self, x: x
     transmuters = defaultTransmuters
 
-    def __init__(self, identity, authorization):
+    def __init__(self, identity, authorization, fields=None):
         self.identity = identity
         self.authorization = authorization
+        #model -> frozenset of field names to serialize
+        self.fields = fields
+
+    def get_fields(self):
+        '''
+        The fields to serialize, the resource has already narrowed them down
+        to what the authorization lets this identity see
+        '''
+        return self.fields
+
+    def get_transmuters(self):
+        transmuters = self.transmuters
+        fields = self.get_fields()
+        if fields:
+            if not isinstance(transmuters, TransmuterTable):
+                transmuters = TransmuterTable(transmuters)
+            #derived tables are cached by the field set, so a scope is compiled once
+            transmuters = transmuters.masked(fields)
+        return transmuters
 
     def normalize(self, obj):
-        #TODO factor in identity & authorization to widdle down acceptable fields
-        return normalize_data(obj, self.defaultTransmuter, self.transmuters)
+        return normalize_data(obj, self.defaultTransmuter, self.get_transmuters())
 
 
 class NormalizedPreparer(Preparer):
     '''
     Resource mixin that normalizes your data against a "globally" defined normalizer
     '''
-    def get_normalizer(self, identity, authorization):
+    def get_normalizer(self, identity, authorization, fields=None):
         from .settings import NORMALIZER
         #settable with django setting: `RESTMORE_NORMALIZER = "python.path"`
         #TODO transmuters should be directly registerable or settingsable
-        return NORMALIZER(identity, authorization)
+        if fields is None:
+            #custom normalizers need not accept `fields`
+            return NORMALIZER(identity, authorization)
+        return NORMALIZER(identity, authorization, fields=fields)
 
-    def prepare(self, data, identity=None, authorization=None):        
-        return self.get_normalizer(identity, authorization).normalize(data)
+    def prepare(self, data, identity=None, authorization=None, fields=None):
+        return self.get_normalizer(identity, authorization, fields).normalize(data)
@@ -0,0 +1,274 @@
+import datetime
+import hashlib
+import json
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured, ValidationError
+from django.core.paginator import Paginator, InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+from .compat import acount, alist
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        #DjangoJSONEncoder drops microseconds, a seek needs the exact value
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super(CursorEncoder, self).default(o)
+
+
+class CursorPage(object):
+    '''
+    A page of results from a CursorPaginator
+    '''
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def get_cursor_fields(model, ordering):
+    '''
+    Returns the fields of a cursor ordering, NULLs can not be seeked past
+    with `>` so nullable fields are refused
+    '''
+    opts = model._meta
+    fields = []
+    for order in ordering:
+        name = order.lstrip('-')
+        field = opts.pk if name == 'pk' else opts.get_field(name)
+        if field.null:
+            raise ImproperlyConfigured('%s.%s is nullable and can not order a cursor' % (
+                opts.label, field.name))
+        fields.append(field)
+    return fields
+
+
+class CursorPaginator(object):
+    '''
+    Keyset pagination: seeks past the last seen ordering values with
+    `WHERE key > last ORDER BY key LIMIT n` instead of counting and offsetting
+    '''
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.per_page = int(per_page)
+        ordering = list(ordering)
+        pk_names = ('pk', self.model._meta.pk.name)
+        if ordering[-1].lstrip('-') not in pk_names:
+            #the last key must be unique for seeking to be stable
+            ordering.append('pk')
+        self.ordering = ordering
+        self.fields = get_cursor_fields(self.model, ordering)
+
+    def get_key(self, obj):
+        return [field.value_from_object(obj) for field in self.fields]
+
+    def encode_cursor(self, values, reverse=False):
+        payload = json.dumps({'v': values, 'r': reverse}, cls=CursorEncoder)
+        return urlsafe_base64_encode(payload.encode('utf8'))
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(urlsafe_base64_decode(cursor).decode('utf8'))
+            values, reverse = payload['v'], bool(payload.get('r'))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursor('Invalid cursor')
+            #a tampered value must fail here rather then in the query
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, KeyError, AttributeError, ValidationError):
+            raise InvalidCursor('Invalid cursor')
+        if any(value is None for value in values):
+            raise InvalidCursor('Invalid cursor')
+        return values, reverse
+
+    def seek(self, ordering, values):
+        '''
+        Builds `(k1 > v1) OR (k1 = v1 AND k2 > v2) ...` honoring descending keys
+        '''
+        query = Q()
+        equal = {}
+        for order, value in zip(ordering, values):
+            name = order.lstrip('-')
+            lookup = '%s__%s' % (name, 'lt' if order.startswith('-') else 'gt')
+            query |= Q(**dict(equal, **{lookup: value}))
+            equal[name] = value
+        return query
+
+    def get_page_queryset(self, cursor=None):
+        '''
+        Returns the seeking queryset (one row past the page) with the decoded cursor
+        '''
+        values, reverse = self.decode_cursor(cursor) if cursor else (None, False)
+        ordering = self.ordering
+        if reverse:
+            ordering = [order[1:] if order.startswith('-') else '-' + order for order in ordering]
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.seek(ordering, values))
+        return queryset[:self.per_page + 1], values, reverse
+
+    def make_page(self, rows, values, reverse):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(self.get_key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(self.get_key(rows[0]), reverse=True)
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        queryset, values, reverse = self.get_page_queryset(cursor)
+        return self.make_page(list(queryset), values, reverse)
+
+    async def apage(self, cursor=None):
+        queryset, values, reverse = self.get_page_queryset(cursor)
+        return self.make_page(await alist(queryset), values, reverse)
+
+
+class ExactCount(object):
+    '''
+    Count strategies return `(count, method)` where method tells the client how exact the total is
+    '''
+    def count(self, queryset):
+        return queryset.count(), 'exact'
+
+    async def acount(self, queryset):
+        return await acount(queryset), 'exact'
+
+
+class CachedCount(ExactCount):
+    '''
+    Exact counts memoized in django's cache framework, keyed by the query's SQL and params
+    '''
+    def __init__(self, timeout=60, cache_alias='default', key_prefix='restmore.count'):
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+
+    def get_cache_key(self, queryset):
+        '''
+        Returns None for a queryset that cannot match anything, ie `.none()`
+        '''
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        digest = hashlib.md5(repr((queryset.db, sql, params)).encode('utf8')).hexdigest()
+        return '%s.%s' % (self.key_prefix, digest)
+
+    def count(self, queryset):
+        cache = caches[self.cache_alias]
+        key = self.get_cache_key(queryset)
+        if key is None:
+            return 0, 'exact'
+        count = cache.get(key)
+        if count is not None:
+            return count, 'cached'
+        count, method = super(CachedCount, self).count(queryset)
+        cache.set(key, count, self.timeout)
+        return count, method
+
+    async def acount(self, queryset):
+        return await sync_to_async(self.count)(queryset)
+
+
+class EstimatedCount(ExactCount):
+    '''
+    Table size estimated from database statistics, used for unfiltered
+    querysets once the estimate reaches `threshold`. On SQLite the row count
+    recorded by the last ANALYZE is used, without one `MAX(rowid)` stands in,
+    which is only an upper bound and overcounts once rows are deleted
+    '''
+    def __init__(self, threshold=100000):
+        self.threshold = threshold
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(table)])
+            elif connection.vendor == 'mysql':
+                cursor.execute('SELECT table_rows FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+            elif connection.vendor == 'sqlite':
+                row = self.analyzed_sqlite_rows(cursor, table)
+                if row is not None:
+                    return row
+                #the rightmost rowid is read straight off the b-tree
+                cursor.execute('SELECT MAX(_ROWID_) FROM %s' % connection.ops.quote_name(table))
+            else:
+                return None
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def analyzed_sqlite_rows(self, cursor, table):
+        '''
+        The row count ANALYZE stored in sqlite_stat1, the first number of any entry for the table
+        '''
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+        row = cursor.fetchone()
+        if row is None or not row[0]:
+            return None
+        return int(row[0].split()[0])
+
+    def count(self, queryset):
+        if not queryset.query.where and not queryset.query.distinct:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate, 'estimated'
+        return super(EstimatedCount, self).count(queryset)
+
+    async def acount(self, queryset):
+        return await sync_to_async(self.count)(queryset)
+
+
+class CountingPaginator(Paginator):
+    '''
+    Paginator whose total comes from a pluggable count strategy
+    '''
+    def __init__(self, object_list, per_page, count_strategy=None, **kwargs):
+        super(CountingPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.count_strategy = count_strategy or ExactCount()
+        self.count_method = None
+
+    @cached_property
+    def count(self):
+        count, self.count_method = self.count_strategy.count(self.object_list)
+        return count
@@ -1,8 +1,120 @@
+import time
+import uuid
+from functools import lru_cache
+from django.contrib.auth import get_permission_codename
+from django.core.cache import caches
+from django.db.models import signals
+
+from .timing import null_timer
+
+
+#view endpoint -> django permission actions, any one of them grants access
+ENDPOINT_ACTIONS = {
+    #in django fashion, you may list if you may view, add, change, or delete
+    'list': ('view', 'add', 'change', 'delete'),
+    'detail': ('view', 'add', 'change', 'delete'),
+    'export': ('view', 'add', 'change', 'delete'),
+    'create': ('add',),
+    'create_list': ('add',),
+    'create_detail': ('add',),
+    'update': ('change',),
+    'update_list': ('change',),
+    'delete': ('delete',),
+    'delete_list': ('delete',),
+}
+
+
+@lru_cache(maxsize=None)
+def get_model_permissions(model):
+    '''
+    Returns endpoint -> tuple of full permission names for a model
+    '''
+    opts = model._meta
+    return dict((endpoint, tuple('%s.%s' % (opts.app_label, get_permission_codename(action, opts))
+        for action in actions)) for endpoint, actions in ENDPOINT_ACTIONS.items())
+
+
+class PermissionCache(object):
+    '''
+    Caches the permission set of each identity, any change to users, groups
+    or permissions starts a new generation of keys
+    '''
+    def __init__(self, timeout=300, cache_alias='default', key_prefix='restmore.permissions'):
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+        self.connected = False
+        #saves that only touch these fields keep the generation
+        self.ignored_fields = frozenset(['last_login'])
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_generation(self):
+        key = self.key_prefix + '.generation'
+        generation = self.cache.get(key)
+        if generation is None:
+            self.cache.add(key, uuid.uuid4().hex, None)
+            generation = self.cache.get(key)
+        return generation
+
+    def invalidate(self, **kwargs):
+        self.cache.set(self.key_prefix + '.generation', uuid.uuid4().hex, None)
+
+    def invalidate_saved(self, update_fields=None, **kwargs):
+        #logging in only saves `last_login`, which no permission depends on
+        if update_fields is not None and update_fields <= self.ignored_fields:
+            return
+        self.invalidate(**kwargs)
+
+    def connect(self):
+        if self.connected:
+            return
+        self.connected = True
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group, Permission
+        user_model = get_user_model()
+        for model in (user_model, Group, Permission):
+            signals.post_save.connect(self.invalidate_saved, sender=model, dispatch_uid=self.key_prefix)
+            signals.post_delete.connect(self.invalidate, sender=model, dispatch_uid=self.key_prefix)
+        for model in (user_model, Group):
+            for field in model._meta.many_to_many:
+                signals.m2m_changed.connect(self.invalidate, sender=field.remote_field.through,
+                    dispatch_uid=self.key_prefix)
+
+    def get_permissions(self, identity, generation=None):
+        if getattr(identity, 'pk', None) is None:
+            return identity.get_all_permissions()
+        self.connect()
+        key = '%s.%s.%s' % (self.key_prefix, generation or self.get_generation(), identity.pk)
+        permissions = self.cache.get(key)
+        if permissions is None:
+            permissions = frozenset(identity.get_all_permissions())
+            self.cache.set(key, permissions, self.timeout)
+        return permissions
+
+
+permission_cache = PermissionCache()
+
+
+#field mask key -> compiled model -> frozenset of visible field names, or None
+_field_masks = {}
+MAX_FIELD_MASKS = 1024
+
+
+def clear_field_masks():
+    _field_masks.clear()
+
+
 #CONSIDER: composable authorizations
 class Authorization(object):
     '''
     Base authorization class, defaults to full authorization
     '''
+    #seconds a compiled field mask is trusted for, see `get_field_mask_version`
+    field_mask_timeout = 300
+
     #CONSIDER: how is this notified about filtering, ids, etc
     def __init__(self, identity, endpoint):
         self.identity = identity
@@ -14,8 +126,59 @@ class Authorization(object):
     def is_authorized(self):
         return True
 
+    def process_form_fields(self, fields, exclude):
+        '''
+        Returns the `(fields, exclude)` an autoform is built with for this identity
+        '''
+        return fields, exclude
+
+    def get_scope_key(self):
+        '''
+        Identifies who may share cached responses, per identity by default
+        '''
+        if self.identity is None or not getattr(self.identity, 'is_authenticated', True):
+            return 'anonymous'
+        return 'identity:%s' % getattr(self.identity, 'pk', self.identity)
+
+    def get_visible_fields(self):
+        '''
+        Returns a dictionary of model -> field names this identity may see, or None for everything.
+        Only consulted once per field mask key, see `get_field_masks`
+        '''
+        return None
+
+    def get_field_mask_version(self):
+        '''
+        Changes whenever compiled masks may be stale, by default every `field_mask_timeout` seconds
+        '''
+        return int(time.time() // self.field_mask_timeout)
+
+    def get_field_mask_key(self):
+        return (type(self), self.endpoint, self.get_scope_key(), self.get_field_mask_version())
+
+    def get_field_masks(self):
+        '''
+        Returns `get_visible_fields` compiled to model -> frozenset, cached per field mask key
+        and resolved once per authorization
+        '''
+        if not hasattr(self, '_masks'):
+            key = self.get_field_mask_key()
+            try:
+                self._masks = _field_masks[key]
+            except KeyError:
+                visible = self.get_visible_fields()
+                masks = None
+                if visible is not None:
+                    masks = dict((model, frozenset(names)) for model, names in visible.items())
+                if len(_field_masks) >= MAX_FIELD_MASKS:
+                    _field_masks.clear()
+                self._masks = _field_masks[key] = masks
+        return self._masks
+
 
 class AuthorizationMixin(object):
+    timer = null_timer
+
     def make_authorization(self, identity, endpoint):
         return Authorization(identity, endpoint)
 
@@ -24,11 +187,15 @@ class AuthorizationMixin(object):
         return self.request.user
 
     def is_authenticated(self):
-        return self.authorization.is_authorized()
+        with self.timer.phase('authorize'):
+            return self.authorization.is_authorized()
 
     def handle(self, endpoint, *args, **kwargs):
-        self.identity = self.get_identity()
-        self.authorization = self.make_authorization(self.identity, endpoint)
+        with self.timer.phase('authorize'):
+            self.identity = self.get_identity()
+            #authorize the view method (ie `delete_list`) rather then the url style
+            view_method = self.http_methods.get(endpoint, {}).get(self.request_method(), endpoint)
+            self.authorization = self.make_authorization(self.identity, view_method)
         return super(AuthorizationMixin, self).handle(endpoint, *args, **kwargs)
 
 
@@ -36,32 +203,56 @@ class DjangoModelAuthorization(Authorization):
     '''
     Your basic django core permission based authorization
     '''
-    def __init__(self, identity, model, endpoint):
+    permission_cache = permission_cache
+
+    def __init__(self, identity, model, endpoint, permissions=None):
         super(DjangoModelAuthorization, self).__init__(identity, endpoint)
         self.model = model
+        self.permissions = permissions or get_model_permissions(model)
+
+    def get_required_permissions(self):
+        try:
+            return self.permissions[self.endpoint]
+        except KeyError:
+            #custom endpoints need a permission of their own name
+            opts = self.model._meta
+            return ('%s.%s' % (opts.app_label, get_permission_codename(self.endpoint, opts)),)
+
+    def get_generation(self):
+        '''
+        The permission cache generation, read once per authorization
+        '''
+        if not hasattr(self, '_generation'):
+            self._generation = self.permission_cache.get_generation()
+        return self._generation
+
+    def get_field_mask_version(self):
+        #masks computed from permissions go stale along with them
+        return self.get_generation()
+
+    def get_field_mask_key(self):
+        return super(DjangoModelAuthorization, self).get_field_mask_key() + (self.model,)
 
     def is_authorized(self):
         #print("auth identity:", self.identity)
         if self.identity.is_superuser:
             return True
-        #TODO proper lookup of label?
-        if self.endpoint == 'list':
+        required = self.get_required_permissions()
+        granted = self.permission_cache.get_permissions(self.identity, self.get_generation())
+        if any(perm in granted for perm in required):
             return True
-            #TODO in django fashion, you have list if you have add, change, or delete
-            return self.identity.has_perm
-        perm_name = self.model._meta.app_label + '.'
-        if self.endpoint == 'create':
-            perm_name += 'add'
-        elif self.endpoint == 'update':
-            perm_name += 'change'
-        else:
-            #TODO delete_list? update_list? others?
-            perm_name += self.endpoint
-
-        perm_name += '_' + self.model.__name__
-        return self.identity.has_perm(perm_name)
+        #backends may implement has_perm without listing permissions
+        return any(self.identity.has_perm(perm) for perm in required)
 
 
 class ModelAuthorizationMixin(AuthorizationMixin):
+    #endpoint -> permission names, resolved when the resource class is defined
+    model_permissions = None
+
+    def __init_subclass__(cls, **kwargs):
+        super(ModelAuthorizationMixin, cls).__init_subclass__(**kwargs)
+        if getattr(cls, 'model', None) is not None:
+            cls.model_permissions = get_model_permissions(cls.model)
+
     def make_authorization(self, identity, endpoint):
-        return DjangoModelAuthorization(identity, self.model, endpoint)
+        return DjangoModelAuthorization(identity, self.model, endpoint, self.model_permissions)
@@ -3,12 +3,18 @@ Request (set serializer in `handle`) -> Resource -> Data
     -> Presentor (set response type in `build_response`, inject hypermedia in `serialize`)
     -> Normalizer (globalized preparer) -> Serializer
 '''
+import hashlib
 import mimeparse
 from collections import namedtuple
-from django.http import HttpResponse
+from collections.abc import Iterator
+from functools import lru_cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from restless.serializers import JSONSerializer
 
 from .normalizer import NormalizedPreparer
+from .timing import null_timer
 
 
 class HybridSerializer(object):
@@ -16,12 +22,49 @@ class HybridSerializer(object):
         self.serializer = serializer
         self.deserializer = deserializer
 
+    #an already encoded JSON body for serializers that embed one, see HTMLSerializer
+    jsondata = None
+
     def serialize(self, data):
+        if self.jsondata is not None:
+            return self.serializer.serialize(data, jsondata=self.jsondata)
         return self.serializer.serialize(data)
 
     def deserialize(self, data):
         return self.deserializer.deserialize(data)
 
+    @property
+    def embeds_json(self):
+        return getattr(self.serializer, 'embeds_json', False)
+
+    @property
+    def normalizes(self):
+        #the serializer normalizes as it encodes, see NormalizingJSONSerializer
+        return getattr(self.serializer, 'normalizes', False)
+
+    @property
+    def streams(self):
+        #the deserializer reads the request stream itself, see MultipartFormSerializer
+        return getattr(self.deserializer, 'streams', False)
+
+    def can_stream(self):
+        return hasattr(self.serializer, 'serialize_stream')
+
+    def serialize_stream(self, data):
+        return self.serializer.serialize_stream(data)
+
+    def can_serialize_rows(self):
+        #a flat row format, see NDJSONSerializer
+        return hasattr(self.serializer, 'serialize_rows')
+
+    def serialize_rows(self, rows):
+        return self.serializer.serialize_rows(rows)
+
+    def serialize_error(self, message):
+        #None when the format has no way to mark a failed stream
+        serialize_error = getattr(self.serializer, 'serialize_error', None)
+        return serialize_error(message) if serialize_error is not None else None
+
 
 class Presentor(object):
     '''
@@ -46,60 +89,135 @@ class StatusException(Exception):
         self.status = status
 
 
+class ShortCircuit(StatusException):
+    '''
+    Raised with a ready made response to skip preparing any data
+    '''
+    def __init__(self, response):
+        super(ShortCircuit, self).__init__('Short circuited', status=response.status_code)
+        self.response = response
+
+
+class ConditionalResponse(ShortCircuit):
+    '''
+    Answers a conditional request, ie 304 Not Modified
+    '''
+
+
+Negotiation = namedtuple('Negotiation', 'request_serializer accept_serializer error presentor presentor_type')
+
+
+def best_match(media_types, header, default='application/json'):
+    '''
+    `mimeparse.best_match`, except that a tie (ie on `*/*`) goes to `default`
+    rather then to whichever media type happens to be listed last
+    '''
+    media_types = [media_type for media_type in media_types if media_type != default] + \
+        ([default] if default in media_types else [])
+    return mimeparse.best_match(media_types, header)
+
+
+def resolve_negotiation(content_type, accept, serializers, presentors):
+    '''
+    Matches raw CONTENT_TYPE and HTTP_ACCEPT header values against the registries,
+    `error` is a `(message, status)` pair when no serializer fits
+    '''
+    media_types = serializers.keys()
+    at = 'application/json' if accept is None else accept #accept type
+    rt = content_type or at #request type
+
+    #intelligent mimetype matching
+    rt = best_match(media_types, rt) or rt
+    at = best_match(media_types, at) or at
+
+    error = None
+    if rt not in serializers:
+        error = ('Invalid Request Type: '+rt, 415)
+    elif at not in serializers:
+        error = ('Invalid Accept Type: '+at, 406)
+
+    ct = accept or content_type or 'application/json'
+    ct = best_match(presentors.keys(), ct) or 'application/json'
+    return Negotiation(serializers.get(rt), serializers.get(at), error, presentors.get(ct), ct)
+
+
+@lru_cache(maxsize=256)
+def negotiate(content_type, accept, version):
+    '''
+    Memoized `resolve_negotiation` against the configured registries,
+    `version` keeps outcomes from before a settings reload from being reused
+    '''
+    from .settings import SERIALIZERS, PRESENTORS
+    return resolve_negotiation(content_type, accept, SERIALIZERS, PRESENTORS)
+
+
 class PresentorResourceMixin(object):
     preparer = NormalizedPreparer()
+    timer = null_timer
+    #send ETag / Last-Modified validators and answer conditional GETs with 304
+    conditional_get = False
+    etag = None
+    last_modified = None
 
     def handle(self, endpoint, *args, **kwargs):
         #why the extra layer of indirection? so we can dynamically switch serializers and hypermedia
-        try:
-            self.serializer = self.make_serializer()
-        except StatusException as error:
-            #TODO use handle_error instead
-            return HttpResponse(error.args[0], status=error.status)
+        with self.timer.phase('negotiate'):
+            try:
+                self.serializer = self.make_serializer()
+            except StatusException as error:
+                #TODO use handle_error instead
+                return HttpResponse(error.args[0], status=error.status)
 
-        try:
-            self.presentor = self.get_presentor()
-        except KeyError:
-            #406 = Bad Accept, 415 = Bad Content Type
-            return HttpResponse('Invalid Accepts', status=406)
+            try:
+                self.presentor = self.get_presentor()
+            except KeyError:
+                #406 = Bad Accept, 415 = Bad Content Type
+                return HttpResponse('Invalid Accepts', status=406)
 
         return super(PresentorResourceMixin, self).handle(endpoint, *args, **kwargs)
 
+    def request_body(self):
+        if self.serializer.streams:
+            #left unread so the deserializer can consume it incrementally
+            return None
+        return super(PresentorResourceMixin, self).request_body()
+
+    def deserialize(self, method, endpoint, body):
+        if body is None and self.serializer.streams and self.has_request_body():
+            return self.serializer.deserialize(None)
+        return super(PresentorResourceMixin, self).deserialize(method, endpoint, body)
+
+    def has_request_body(self):
+        try:
+            return int(self.request.META.get('CONTENT_LENGTH') or 0) > 0
+        except ValueError:
+            return False
+
     def build_status_response(self, data, status=400):
         '''
         An event occurred preventing the request from being completed
         '''
         raise StatusException(data, status)
 
+    def get_negotiation(self):
+        if getattr(self, '_negotiation', None) is None:
+            from . import settings
+            self._negotiation = negotiate(self.request.META.get('CONTENT_TYPE'),
+                self.request.META.get('HTTP_ACCEPT'), settings.VERSION)
+        return self._negotiation
+
     def make_serializer(self):
         '''
         Constructs the serializers to be used based on HTTP Headers
         settable with django setting: `RESTMORE_SERIALIZERS`
         '''
         #print("make_serializer:", self.request.META)
-        from .settings import SERIALIZERS
-        media_types = SERIALIZERS.keys()
-
-        rt = self.request.META.get('CONTENT_TYPE') #request type
-        at = self.request.META.get('HTTP_ACCEPT', 'application/json') #accept type
-        #print("make_serializer:", rt, at)
-        rt = rt or at
-
-        #intelligent mimetype matching
-        rt = mimeparse.best_match(media_types, rt) or rt
-        at = mimeparse.best_match(media_types, at) or at
-
-        try:
-            rt_serializer = SERIALIZERS[rt]
-        except KeyError:
-            raise StatusException('Invalid Request Type: '+rt, 415)
-        try:
-            at_serializer = SERIALIZERS[at]
-        except KeyError:
-            raise StatusException('Invalid Accept Type: '+at, 406)
+        negotiation = self.get_negotiation()
+        if negotiation.error:
+            raise StatusException(*negotiation.error)
 
-        at_serializer = at_serializer()
-        rt_serializer = rt_serializer()
+        at_serializer = negotiation.accept_serializer()
+        rt_serializer = negotiation.request_serializer()
         #hack so that serializers can read headers, like boundary
         at_serializer.request = self.request
         rt_serializer.request = self.request
@@ -110,20 +228,67 @@ class PresentorResourceMixin(object):
         Constructs the presentor to be used based on HTTP Headers
         settable with django setting: `RESTMORE_PRESENTORS`
         '''
-        from .settings import PRESENTORS
-        ct = self.request.META.get('HTTP_ACCEPT') or self.request.META.get('CONTENT_TYPE') or 'application/json'
-        ct = mimeparse.best_match(PRESENTORS.keys(), ct) or 'application/json'
-        return PRESENTORS[ct](ct)
+        negotiation = self.get_negotiation()
+        if negotiation.presentor is None:
+            raise KeyError(negotiation.presentor_type)
+        return negotiation.presentor(negotiation.presentor_type)
+
+    def is_conditional(self):
+        return self.conditional_get and self.request.method in ('GET', 'HEAD')
+
+    def set_validators(self, response):
+        if self.etag is not None:
+            response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        return response
+
+    def check_conditions(self, etag=None, last_modified=None):
+        '''
+        Records the validators for the response and raises ConditionalResponse
+        if the client's copy is still current.
+        `last_modified` is a unix timestamp
+        '''
+        if not self.is_conditional():
+            return
+        self.etag = quote_etag(etag) if etag is not None else None
+        self.last_modified = int(last_modified) if last_modified is not None else None
+        response = get_conditional_response(self.request, etag=self.etag,
+            last_modified=self.last_modified, response=self.set_validators(HttpResponse()))
+        if response.status_code != 200:
+            raise ConditionalResponse(response)
+
+    def build_error(self, err):
+        if isinstance(err, ShortCircuit):
+            return err.response
+        return super(PresentorResourceMixin, self).build_error(err)
 
     def build_response(self, data, status=200):
-        assert isinstance(data, (str, bytes)), "build_response only accepts serialized data"
-        resp = HttpResponse(data, content_type=self.presentor.get_response_type())
+        if isinstance(data, Iterator):
+            #serialized chunks from a streaming serializer
+            resp = StreamingHttpResponse(data, content_type=self.presentor.get_response_type())
+        else:
+            assert isinstance(data, (str, bytes)), "build_response only accepts serialized data"
+            resp = HttpResponse(data, content_type=self.presentor.get_response_type())
         resp.status_code = status
+        if status == 200 and self.is_conditional():
+            if self.etag is None and self.last_modified is None and not resp.streaming:
+                #fallback validator, saves the bandwidth but not the work
+                self.etag = quote_etag(hashlib.md5(resp.content).hexdigest())
+                resp = get_conditional_response(self.request, etag=self.etag, response=self.set_validators(resp))
+            else:
+                self.set_validators(resp)
         return resp
 
     def serialize(self, method, endpoint, data):
-        hyperdata = self.presentor.inject(method, endpoint, data)
-        return super(PresentorResourceMixin, self).serialize(method, endpoint, hyperdata)
+        with self.timer.phase('inject'):
+            hyperdata = self.presentor.inject(method, endpoint, data)
+        if self.is_fused():
+            self.serializer.serializer.normalizer = self.get_normalizer()
+        if self.serializer.embeds_json:
+            self.serializer.jsondata = self.get_jsondata()
+        with self.timer.phase('serialize'):
+            return super(PresentorResourceMixin, self).serialize(method, endpoint, hyperdata)
 
     def prepare(self, data):
         """
@@ -134,5 +299,40 @@ class PresentorResourceMixin(object):
         :returns: A potentially reshaped dict
         :rtype: dict
         """
+        if self.is_fused():
+            #normalized by the serializer in the same pass as encoding
+            return data
         #pass along identity & authorization to the preparer so that fields may be properly masked
-        return self.preparer.prepare(data, identity=self.identity, authorization=self.authorization)
+        with self.timer.phase('normalize'):
+            return self.preparer.prepare(data, identity=self.identity, authorization=self.authorization,
+                fields=self.get_visible_fields())
+
+    def prepare_rows(self, rows):
+        '''
+        Lazily prepares an iterable of items, with one normalizer for all of them
+        rather then one per `prepare` call
+        '''
+        if self.is_fused() or not isinstance(self.preparer, NormalizedPreparer):
+            return (self.prepare(row) for row in rows)
+        normalize = self.get_normalizer().normalize
+        return (normalize(row) for row in rows)
+
+    def is_fused(self):
+        return self.serializer.normalizes and isinstance(self.preparer, NormalizedPreparer)
+
+    def get_normalizer(self):
+        return self.preparer.get_normalizer(self.identity, self.authorization, fields=self.get_visible_fields())
+
+    def get_jsondata(self):
+        '''
+        Returns the already encoded JSON body of this response, or None to have it encoded
+        '''
+        return None
+
+    def get_visible_fields(self):
+        '''
+        Returns a dictionary of model -> field names to restrict normalized output to, or None.
+        Defaults to the authorization's field masks
+        '''
+        get_field_masks = getattr(getattr(self, 'authorization', None), 'get_field_masks', None)
+        return get_field_masks() if get_field_masks is not None else None
@@ -1,17 +1,259 @@
 from django.http.multipartparser import MultiPartParser, MultiPartParserError
-from django.template.loader import render_to_string
-from io import BytesIO
+from django.core.signals import setting_changed
+from django.template import loader
+from django.utils.html import escape
+from restless.exceptions import BadRequest
+from restless.serializers import JSONSerializer as BaseJSONSerializer
+from restless.utils import MoreTypesJSONEncoder
+from collections.abc import Iterator
+from functools import lru_cache
+from io import BytesIO, StringIO
+from json.encoder import encode_basestring_ascii
+import csv
+import datetime
 import json
+import uuid
+
+from .normalizer import (TransmuterTable, defaultTransmuters, classify, _normalize,
+    PRIMITIVE, BYTES, LIST, DICT, SET, ITERABLE)
 
 #CONSIDER MultiValueDict vs reqular Dict
 
+class JSONSerializer(BaseJSONSerializer):
+    '''
+    restless JSONSerializer that can also encode a response incrementally
+    '''
+    def encode(self, data):
+        '''
+        The encoded `data` as text, serialize_stream builds its chunks from it
+        '''
+        return self.serialize(data)
+
+    def serialize_stream(self, data):
+        '''
+        Yields the encoded `data` in chunks, iterator values (ie the rows of
+        a list response) are encoded one item at a time
+        '''
+        yield '{'
+        for index, (key, value) in enumerate(data.items()):
+            yield (', ' if index else '') + json.dumps(key) + ': '
+            if isinstance(value, Iterator):
+                yield '['
+                for position, item in enumerate(value):
+                    yield (', ' if position else '') + self.encode(item)
+                yield ']'
+            else:
+                yield self.encode(value)
+        yield '}'
+
+
+_leaf_encoder = MoreTypesJSONEncoder()
+#encoded as strings by MoreTypesJSONEncoder.default
+_string_types = (datetime.datetime, datetime.date, datetime.time, uuid.UUID)
+
+
+def _float(value):
+    #same spelling as json.dumps
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return 'Infinity'
+    if value == float('-inf'):
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+def _key(key):
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, int):
+        return int.__repr__(key)
+    if isinstance(key, float):
+        return _float(key)
+    raise TypeError('keys must be str, int, float, bool or None, not %s' % type(key).__name__)
+
+
+def _bool(value):
+    return 'true' if value else 'false'
+
+
+def _make_encoder(write, notfound, enc):
+    '''
+    Returns a function that mirrors normalizer._normalize but writes json
+    fragments instead of building primitives
+    '''
+    resolve = enc.resolve
+    #exact types that encode straight away unless the table transmutes them
+    leaves = {}
+    for cls, leaf in ((str, encode_basestring_ascii), (int, int.__repr__), (bool, _bool), (float, _float)):
+        if resolve(cls) is None:
+            leaves[cls] = leaf
+    plain_keys = str in leaves
+
+    def encode(obj):
+        cls = type(obj)
+        leaf = leaves.get(cls)
+        if leaf is not None:
+            write(leaf(obj))
+            return
+        #classes are dispatched by their own mro
+        encoder = resolve(obj if issubclass(cls, type) else cls)
+        if encoder:
+            return encode(encoder(obj))
+        kind = classify(cls)
+        if kind == PRIMITIVE:
+            if issubclass(cls, str):
+                write(encode_basestring_ascii(obj))
+            elif issubclass(cls, int):
+                write(_bool(obj) if issubclass(cls, bool) else int.__repr__(obj))
+            elif issubclass(cls, float):
+                write(_float(obj))
+            else:
+                #decimals are strings, as with MoreTypesJSONEncoder
+                write(encode_basestring_ascii(str(obj)))
+        elif kind == BYTES:
+            #TODO this is not proper
+            write(encode_basestring_ascii(obj.decode('utf8')))
+        elif kind == DICT:
+            separator = '{'
+            for key, value in obj.items():
+                if not (plain_keys and type(key) is str):
+                    key = _key(_normalize(key, notfound, enc))
+                write(separator + encode_basestring_ascii(key) + ': ')
+                separator = ', '
+                encode(value)
+            write('}' if separator == ', ' else '{}')
+        elif kind in (LIST, SET, ITERABLE):
+            separator = '['
+            for item in obj:
+                write(separator)
+                separator = ', '
+                encode(item)
+            write(']' if separator == ', ' else '[]')
+        else:
+            value = notfound(obj)
+            leaf = leaves.get(type(value))
+            if value is None:
+                write('null')
+            elif leaf is not None:
+                write(leaf(value))
+            elif isinstance(value, _string_types):
+                write(encode_basestring_ascii(_leaf_encoder.default(value)))
+            else:
+                write(_leaf_encoder.encode(value))
+    return encode
+
+
+class _ByteBuffer(object):
+    '''
+    Collects the encoder's fragments, which are all ASCII, as bytes. They are
+    encoded a batch at a time, cheaper then one `.encode` per fragment and far
+    smaller then holding every fragment as a str until the end
+    '''
+    batch_size = 4096
+
+    def __init__(self):
+        self.chunks = []
+        self.fragments = []
+
+    def write(self, fragment):
+        fragments = self.fragments
+        fragments.append(fragment)
+        if len(fragments) >= self.batch_size:
+            self.chunks.append(''.join(fragments).encode('ascii'))
+            fragments.clear()
+
+    def getvalue(self):
+        if self.fragments:
+            self.chunks.append(''.join(self.fragments).encode('ascii'))
+            self.fragments.clear()
+        return b''.join(self.chunks)
+
+
+def _encode(obj, write, notfound, enc):
+    if not isinstance(enc, TransmuterTable):
+        enc = TransmuterTable(enc)
+    _make_encoder(write, notfound, enc)(obj)
+
+
+def encode_data(obj, notfound=lambda x: x, enc=defaultTransmuters):
+    '''
+    Normalizes and JSON encodes an object in a single walk, the output matches
+    `json.dumps(normalize_data(obj), cls=MoreTypesJSONEncoder)` except that sets
+    become arrays and `notfound` is only applied to leaf values
+    '''
+    buffer = StringIO()
+    _encode(obj, buffer.write, notfound, enc)
+    return buffer.getvalue()
+
+
+def encode_data_bytes(obj, notfound=lambda x: x, enc=defaultTransmuters):
+    '''
+    `encode_data` written into a byte buffer, ready to be a response body as is
+    '''
+    buffer = _ByteBuffer()
+    _encode(obj, buffer.write, notfound, enc)
+    return buffer.getvalue()
+
+
+class NormalizingJSONSerializer(JSONSerializer):
+    '''
+    JSONSerializer that normalizes while it encodes, the resource skips its
+    prepare pass and hands over the normalizer instead.
+    Opt in with `RESTMORE_SERIALIZERS = {'application/json': 'restmore.serializers.NormalizingJSONSerializer', ...}`
+    '''
+    normalizes = True
+    normalizer = None
+
+    def get_normalizer(self):
+        if self.normalizer is None:
+            from .settings import NORMALIZER
+            self.normalizer = NORMALIZER(None, None)
+        return self.normalizer
+
+    def encode(self, data):
+        normalizer = self.get_normalizer()
+        return encode_data(data, normalizer.defaultTransmuter, normalizer.get_transmuters())
+
+    def serialize(self, data):
+        #bytes, so HttpResponse takes the body as it is instead of encoding it again
+        normalizer = self.get_normalizer()
+        return encode_data_bytes(data, normalizer.defaultTransmuter, normalizer.get_transmuters())
+
+
 class MultipartFormSerializer(object):
+    '''
+    Parses multipart bodies straight off the request stream with the request's
+    upload handlers, so large files spill to temporary files instead of memory.
+    Uploaded files are merged into the returned data
+    '''
+    #the resource leaves the body unread and passes None
+    streams = True
+
     def deserialize(self, data):
-        #TODO restless should pass in headers?
-        parser = MultiPartParser(self.request.META, BytesIO(data), [], encoding=self.request.encoding)
-        #TODO merge in files?
-        post, files = parser.parse()
-        return post
+        request = self.request
+        try:
+            if request.method == 'POST':
+                #django parses POST bodies the same way, and middleware may already have
+                post, files = request.POST, request.FILES
+            else:
+                #TODO restless should pass in headers?
+                stream = request if data is None else BytesIO(data)
+                parser = MultiPartParser(request.META, stream, request.upload_handlers, encoding=request.encoding)
+                post, files = parser.parse()
+        except MultiPartParserError as error:
+            raise BadRequest(str(error))
+        data = post.copy()
+        for key, values in files.lists():
+            data.setlist(key, values)
+        return data
+
 
 #TODO
 class UrlSerializer(object):
@@ -22,6 +264,160 @@ class UrlSerializer(object):
         pass
 
 
-class HTMLSerializer(object):
+def _list_rows(data):
+    #the objects of a list response, a list, or a single document
+    if isinstance(data, dict) and isinstance(data.get('objects'), list):
+        return data['objects']
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+class NDJSONSerializer(object):
+    '''
+    Newline delimited JSON, one document per line. Exports stream a row per
+    line in chunks of about `chunk_length` characters
+    '''
+    chunk_length = 64 * 1024
+    encoder = MoreTypesJSONEncoder()
+
+    def serialize(self, data):
+        return ''.join(self.serialize_rows(_list_rows(data)))
+
+    def serialize_rows(self, rows):
+        encode = self.encoder.encode
+        buffer = []
+        length = 0
+        for row in rows:
+            line = encode(row) + '\n'
+            buffer.append(line)
+            length += len(line)
+            if length >= self.chunk_length:
+                yield ''.join(buffer)
+                buffer = []
+                length = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    def serialize_error(self, message):
+        '''
+        The line ending a stream that failed part way
+        '''
+        return self.encoder.encode({'error': message}) + '\n'
+
+    def deserialize(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        try:
+            return [json.loads(line) for line in data.splitlines() if line.strip()]
+        except ValueError as error:
+            raise BadRequest('Invalid NDJSON: %s' % error)
+
+
+class CSVSerializer(object):
+    '''
+    Comma separated values with a header row taken from the first row's keys,
+    nested values are written as JSON and None as an empty cell. Output only
+    '''
+    chunk_length = 64 * 1024
+    encoder = MoreTypesJSONEncoder()
+
+    def format_value(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list, tuple)):
+            return self.encoder.encode(value)
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, (str, int, float)):
+            return value
+        return self.encoder.default(value)
+
     def serialize(self, data):
-        return render_to_string('restmore/response.html', {'data': data, 'jsondata': json.dumps(data)})
+        return ''.join(self.serialize_rows(_list_rows(data)))
+
+    def serialize_rows(self, rows):
+        buffer = StringIO()
+        writer = None
+        format_value = self.format_value
+        for row in rows:
+            if not isinstance(row, dict):
+                row = {'value': row}
+            if writer is None:
+                columns = list(row)
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+            writer.writerow([format_value(row.get(column)) for column in columns])
+            if buffer.tell() >= self.chunk_length:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def serialize_error(self, message):
+        '''
+        The row ending a stream that failed part way, a single `ERROR: ...` cell
+        '''
+        buffer = StringIO()
+        csv.writer(buffer).writerow(['ERROR: %s' % message])
+        return buffer.getvalue()
+
+    def deserialize(self, data):
+        raise BadRequest('text/csv is only available as a response type')
+
+
+@lru_cache(maxsize=None)
+def get_template(template_name):
+    '''
+    Resolves and compiles a template once rather then per response
+    '''
+    return loader.get_template(template_name)
+
+
+def reset_templates(setting, **kwargs):
+    if setting in ('TEMPLATES', 'INSTALLED_APPS'):
+        get_template.cache_clear()
+
+setting_changed.connect(reset_templates)
+
+
+class HTMLSerializer(object):
+    '''
+    Renders the JSON representation into an HTML page, list payloads stream
+    the page around the incrementally encoded rows
+    '''
+    template_name = 'restmore/response.html'
+    json_serializer = JSONSerializer()
+    #the resource may hand over the JSON body it already has, see PresentorResourceMixin.get_jsondata
+    embeds_json = True
+
+    def get_template(self):
+        return get_template(self.template_name)
+
+    def serialize(self, data, jsondata=None):
+        '''
+        `jsondata` takes an already encoded JSON body so it is not encoded twice
+        '''
+        if jsondata is None:
+            jsondata = self.json_serializer.serialize(data)
+        return self.get_template().render({'data': data, 'jsondata': jsondata})
+
+    def serialize_stream(self, data):
+        '''
+        Renders the page once around a marker and yields its head, the escaped
+        JSON chunks and its tail, iterator values are left out of `data` in the template
+        '''
+        marker = uuid.uuid4().hex
+        context = {key: value for key, value in data.items() if not isinstance(value, Iterator)}
+        page = self.get_template().render({'data': context, 'jsondata': marker})
+        if page.count(marker) != 1:
+            #the template needs the complete payload
+            data = {key: list(value) if isinstance(value, Iterator) else value for key, value in data.items()}
+            yield self.serialize(data)
+            return
+        head, tail = page.split(marker)
+        yield head
+        for chunk in self.json_serializer.serialize_stream(data):
+            yield escape(chunk)
+        yield tail
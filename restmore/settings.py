@@ -1,24 +1,52 @@
 from django.conf import settings
+from django.core.signals import setting_changed
 from django.utils.module_loading import import_string
 
-PRESENTORS = getattr(settings, 'RESTMORE_PRESENTORS',
-    {'application/json': 'restmore.presentors.Presentor'})
+#ties, ie on `*/*`, go to application/json whatever the order, see presentors.best_match
+DEFAULT_PRESENTORS = {'application/x-ndjson': 'restmore.presentors.Presentor',
+     'text/csv': 'restmore.presentors.Presentor',
+     'application/json': 'restmore.presentors.Presentor',}
 
-SERIALIZERS = getattr(settings, 'RESTMORE_SERIALIZERS',
-    {'application/json': 'restless.serializers.JSONSerializer',
+#as above, `*/*` resolves to application/json
+DEFAULT_SERIALIZERS = {'application/json': 'restmore.serializers.JSONSerializer',
      'multipart/form-data': 'restmore.serializers.MultipartFormSerializer',
      'application/x-www-form-urlencoded': 'restmore.serializers.UrlSerializer',
+     'application/x-ndjson': 'restmore.serializers.NDJSONSerializer',
+     'text/csv': 'restmore.serializers.CSVSerializer',
      'text/html': 'restmore.serializers.HTMLSerializer',
      'application/xhtml+xml': 'restmore.serializers.HTMLSerializer',
      'application/text-html': 'restmore.serializers.HTMLSerializer',
-     'text/plain': 'restmore.serializers.HTMLSerializer',})
+     'text/plain': 'restmore.serializers.HTMLSerializer',}
 
-NORMALIZER = getattr(settings, 'RESTMORE_NORMALIZER', 'restmore.normalizer.Normalizer')
+DEFAULT_NORMALIZER = 'restmore.normalizer.Normalizer'
 
-for key, value in PRESENTORS.items():
-    PRESENTORS[key] = import_string(value)
+PRESENTORS = {}
+SERIALIZERS = {}
+NORMALIZER = None
+#bumped whenever the registries are (re)loaded so memoized lookups can tell
+VERSION = 0
 
-for key, value in SERIALIZERS.items():
-    SERIALIZERS[key] = import_string(value)
 
-NORMALIZER = import_string(NORMALIZER)
+def _resolve(value):
+    return import_string(value) if isinstance(value, str) else value
+
+
+def load():
+    global NORMALIZER, VERSION
+    PRESENTORS.clear()
+    for key, value in getattr(settings, 'RESTMORE_PRESENTORS', DEFAULT_PRESENTORS).items():
+        PRESENTORS[key] = _resolve(value)
+    SERIALIZERS.clear()
+    for key, value in getattr(settings, 'RESTMORE_SERIALIZERS', DEFAULT_SERIALIZERS).items():
+        SERIALIZERS[key] = _resolve(value)
+    NORMALIZER = _resolve(getattr(settings, 'RESTMORE_NORMALIZER', DEFAULT_NORMALIZER))
+    VERSION += 1
+
+
+def reload_settings(setting, **kwargs):
+    if setting.startswith('RESTMORE_'):
+        load()
+
+setting_changed.connect(reload_settings)
+
+load()
@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+
+from .debug import QueryRecorder
+
+
+class QueryBudgetTestMixin(object):
+    '''
+    TestCase mixin asserting a resource's query budget
+
+        with self.assertQueryBudget(MyResource, 'list'):
+            self.client.get('/api/things/')
+    '''
+    @contextmanager
+    def assertQueryBudget(self, resource, view_method, max_queries=None):
+        '''
+        Fails if the block issues more queries then `max_queries` (by default the
+        resource's budget for `view_method`) or repeats a read N+1 style
+        '''
+        with QueryRecorder() as recorder:
+            yield recorder
+        problems = resource.check_queries(view_method, recorder.queries,
+            detect_n_plus_one=True, max_queries=max_queries)
+        if problems:
+            self.fail('\n'.join(problems))
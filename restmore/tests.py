@@ -1,16 +1,46 @@
 from collections import namedtuple
 from django.utils.datastructures import MultiValueDict
-from django.test import TestCase
-from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User, Group, Permission
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction, DatabaseError
+from django.db.models import signals
+from django.core.serializers.python import Serializer
+from django.core.cache import caches
 
 from restmore.forms import DjangoFormMixin
-from restmore.normalizer import normalize_data, Normalizer, NormalizedPreparer, defaultTransmuters
-from restmore.presentors import HybridSerializer
-from restmore.permissions import Authorization, DjangoModelAuthorization, AuthorizationMixin, ModelAuthorizationMixin
+from restmore.normalizer import normalize_data, Normalizer, NormalizedPreparer, defaultTransmuters, TransmuterTable, \
+    normalize_model_instance, get_field_plan
+from restmore.presentors import HybridSerializer, Presentor, PresentorResourceMixin, negotiate, \
+    resolve_negotiation
+from restmore import settings as restmore_settings
+from restmore.permissions import Authorization, DjangoModelAuthorization, AuthorizationMixin, ModelAuthorizationMixin, \
+    clear_field_masks, permission_cache
 from restmore.crud import DjangoModelResource
+from restmore.asynccrud import AsyncDjangoModelResource
+from restmore.pagination import ExactCount, CachedCount, EstimatedCount, CursorPaginator
+from restmore.cache import ResponseCache
+from restmore.timing import PhaseTimer, request_timed
+from restmore.debug import QueryBudgetExceeded
+from restmore.testing import QueryBudgetTestMixin
+from restmore.filters import get_indexed_fields
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode, http_date
+from django.core.exceptions import ImproperlyConfigured
 
-from restless.serializers import JSONSerializer
+from restmore.serializers import JSONSerializer, NormalizingJSONSerializer, MultipartFormSerializer, encode_data, \
+    encode_data_bytes, get_template, NDJSONSerializer, CSVSerializer
+from restless.exceptions import BadRequest
+from django.test.client import RequestFactory, encode_multipart, BOUNDARY, MULTIPART_CONTENT
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.utils.translation import gettext_lazy
+import datetime
+import decimal
 
+from restless.utils import MoreTypesJSONEncoder
+
+from unittest import mock
+import html
 import json
 
 
@@ -33,6 +63,15 @@ class FormTestCase(TestCase):
         self.assertTrue('files' in kwargs)
         self.assertEqual(kwargs['data'].get('message'), 'hello world')
 
+    def test_make_form_merges_parsed_files(self):
+        target = DjangoFormMixin()
+        upload = SimpleUploadedFile('hello.txt', b'hello world')
+        target.data = MultiValueDict({'message': ['hello world'], 'attachment': [upload]})
+        target.request = MockedRequest(FILES=MultiValueDict())
+        target.form_class = lambda **kwargs: kwargs
+        kwargs = target.make_form()
+        self.assertIs(kwargs['files']['attachment'], upload)
+
 
 MockedObject = namedtuple('MockedObject', 'message')
 testTransmuters = dict(defaultTransmuters)
@@ -41,6 +80,14 @@ testTransmuters[MockedObject] = lambda x: x.message
 class SecondaryMockedObject(MockedObject):
     pass
 
+class UsernameOnlyAuthorization(Authorization):
+    compiled = 0
+
+    def get_visible_fields(self):
+        UsernameOnlyAuthorization.compiled += 1
+        return {User: ['username']}
+
+
 class NormalizerTestCase(TestCase):
     def test_normalize_data_handles_yeild(self):
         def yielder():
@@ -69,6 +116,59 @@ class NormalizerTestCase(TestCase):
         result = normalize_data(data, enc=testTransmuters)
         self.assertEqual(result, 'hello world')
 
+    def test_normalize_data_handles_alias(self):
+        table = TransmuterTable(testTransmuters)
+        table['shout'] = lambda x: x.message.upper()
+        table['SecondaryMockedObject'] = 'shout'
+        result = normalize_data(SecondaryMockedObject('hello world'), enc=table)
+        self.assertEqual(result, 'HELLO WORLD')
+
+    def test_transmuter_table_invalidates_on_change(self):
+        table = TransmuterTable(testTransmuters)
+        self.assertEqual(normalize_data(MockedObject('hello world'), enc=table), 'hello world')
+        table[MockedObject] = lambda x: x.message.upper()
+        self.assertEqual(normalize_data(MockedObject('hello world'), enc=table), 'HELLO WORLD')
+        del table[MockedObject]
+        self.assertEqual(normalize_data(MockedObject('hello world'), enc=table), ['hello world'])
+        table |= {MockedObject: lambda x: x.message.title()}
+        self.assertEqual(normalize_data(MockedObject('hello world'), enc=table), 'Hello World')
+
+    def test_normalize_model_instance_matches_serializer(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        user.groups.add(Group.objects.create(name='staff'))
+        #what the original implementation asked for, django ignores `use_natural_keys`
+        flat_obj = Serializer().serialize([user], use_natural_keys=True)[0]
+        expected = dict(flat_obj['fields'], pk=flat_obj['pk'])
+        self.assertEqual(normalize_model_instance(user), expected)
+
+    def test_normalize_model_instance_relations_are_pks(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        group = Group.objects.create(name='staff')
+        user.groups.add(group)
+        self.assertEqual(normalize_model_instance(user)['groups'], [group.pk])
+        permission = Permission.objects.get(codename='view_user')
+        self.assertEqual(normalize_model_instance(permission)['content_type'], permission.content_type_id)
+
+    def test_field_plan_subset(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        plan = get_field_plan(User, frozenset(['username', 'email']))
+        self.assertEqual(plan(user), {'username': 'foo', 'email': 'foo@domain.com', 'pk': user.pk})
+
+    def test_normalizer_normalize_masked_fields(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        normalizer = Normalizer(identity=None, authorization=None, fields={User: frozenset(['email'])})
+        result = normalizer.normalize([user])
+        self.assertEqual(result, [{'email': 'foo@domain.com', 'pk': user.pk}])
+
+    def test_presentor_visible_fields_are_authorization_masks(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        resource = PresentorResourceMixin()
+        resource.identity = None
+        resource.authorization = UsernameOnlyAuthorization(None, 'list')
+        resource.serializer = HybridSerializer(JSONSerializer(), JSONSerializer())
+        self.assertEqual(resource.get_visible_fields(), {User: frozenset(['username'])})
+        self.assertEqual(resource.prepare([user]), [{'username': 'foo', 'pk': user.pk}])
+
     def test_normalizer_normalize(self):
         normalizer = Normalizer(identity=None, authorization=None)
         result = normalizer.normalize('hello world')
@@ -79,6 +179,17 @@ class NormalizerTestCase(TestCase):
         result = mixin.prepare('hello world')
         self.assertEqual(result, 'hello world')
 
+    def test_normalized_preparer_two_argument_normalizer(self):
+        class LegacyNormalizer(Normalizer):
+            def __init__(self, identity, authorization):
+                super(LegacyNormalizer, self).__init__(identity, authorization)
+
+        with override_settings(RESTMORE_NORMALIZER=LegacyNormalizer):
+            self.assertEqual(NormalizedPreparer().prepare('hello world'), 'hello world')
+
+    def test_field_plan_cache_is_bounded(self):
+        self.assertIsNotNone(get_field_plan.cache_info().maxsize)
+
 
 class PermissionsTestCase(TestCase):
     def test_authorization_process_queryset(self):
@@ -86,6 +197,25 @@ class PermissionsTestCase(TestCase):
         result = authorization.process_queryset(['foo'])
         self.assertEqual(result, ['foo'])
 
+    def test_authorization_field_masks_are_compiled_once(self):
+        clear_field_masks()
+        UsernameOnlyAuthorization.compiled = 0
+        with mock.patch('restmore.permissions.time.time', return_value=0):
+            for attempt in range(3):
+                masks = UsernameOnlyAuthorization(None, 'list').get_field_masks()
+        self.assertEqual(masks, {User: frozenset(['username'])})
+        self.assertEqual(UsernameOnlyAuthorization.compiled, 1)
+        self.assertEqual(Authorization(None, 'list').get_field_masks(), None)
+
+    def test_authorization_field_masks_expire(self):
+        clear_field_masks()
+        UsernameOnlyAuthorization.compiled = 0
+        with mock.patch('restmore.permissions.time.time', return_value=0):
+            UsernameOnlyAuthorization(None, 'list').get_field_masks()
+        with mock.patch('restmore.permissions.time.time', return_value=UsernameOnlyAuthorization.field_mask_timeout):
+            UsernameOnlyAuthorization(None, 'list').get_field_masks()
+        self.assertEqual(UsernameOnlyAuthorization.compiled, 2)
+
     def test_authorization_is_authorized(self):
         authorization = Authorization(None, None)
         result = authorization.is_authorized()
@@ -113,7 +243,123 @@ class PermissionsTestCase(TestCase):
         authorization = DjangoModelAuthorization(identity, User, 'list')
         result = authorization.is_authorized()
         self.assertEqual(result, True)
-        #TODO this is far less then enough
+
+    def test_django_model_authorization_checks_endpoint_permission(self):
+        caches['default'].clear()
+        identity = User.objects.create(username='foo', email='foo@domain.com')
+        authorization = DjangoModelAuthorization(identity, User, 'delete_list')
+        self.assertEqual(authorization.is_authorized(), False)
+        identity.user_permissions.add(Permission.objects.get(codename='delete_user'))
+        identity = User.objects.get(pk=identity.pk)
+        authorization = DjangoModelAuthorization(identity, User, 'delete_list')
+        self.assertEqual(authorization.is_authorized(), True)
+        with self.assertNumQueries(0):
+            self.assertEqual(DjangoModelAuthorization(identity, User, 'list').is_authorized(), True)
+            self.assertEqual(DjangoModelAuthorization(identity, User, 'update_list').is_authorized(), False)
+
+    def test_django_model_authorization_falls_back_to_has_perm(self):
+        caches['default'].clear()
+        identity = User.objects.create(username='foo', email='foo@domain.com')
+        with mock.patch.object(User, 'has_perm', lambda self, perm, obj=None: perm == 'auth.delete_user'):
+            self.assertEqual(DjangoModelAuthorization(identity, User, 'delete_list').is_authorized(), True)
+            self.assertEqual(DjangoModelAuthorization(identity, User, 'update_list').is_authorized(), False)
+
+    def test_permission_cache_ignores_last_login(self):
+        identity = User.objects.create(username='foo', email='foo@domain.com')
+        permission_cache.get_permissions(identity)
+        generation = permission_cache.get_generation()
+        identity.last_login = timezone.now()
+        identity.save(update_fields=['last_login'])
+        self.assertEqual(permission_cache.get_generation(), generation)
+        identity.is_staff = True
+        identity.save()
+        self.assertNotEqual(permission_cache.get_generation(), generation)
+
+    def test_model_authorization_mixin_resolves_permissions(self):
+        self.assertEqual(UserModelResource.model_permissions['update_list'], ('auth.change_user',))
+
+
+class NegotiationTestCase(TestCase):
+    def test_negotiate(self):
+        negotiation = negotiate('application/json', 'text/html', restmore_settings.VERSION)
+        self.assertEqual(negotiation.request_serializer, JSONSerializer)
+        self.assertEqual(negotiation.accept_serializer.__name__, 'HTMLSerializer')
+        self.assertEqual(negotiation.error, None)
+        self.assertEqual(negotiation.presentor, Presentor)
+
+    def test_negotiate_invalid_accept(self):
+        negotiation = negotiate(None, 'application/bogus', restmore_settings.VERSION)
+        self.assertEqual(negotiation.error[1], 415)
+        negotiation = negotiate('application/json', 'application/bogus', restmore_settings.VERSION)
+        self.assertEqual(negotiation.error[1], 406)
+
+    def test_negotiate_wildcard(self):
+        #the export formats must not win a `*/*` tie
+        negotiation = negotiate(None, '*/*', restmore_settings.VERSION)
+        self.assertEqual(negotiation.accept_serializer, JSONSerializer)
+        self.assertEqual(negotiation.presentor_type, 'application/json')
+        #whatever order the registries list them in
+        serializers = dict(reversed(list(restmore_settings.SERIALIZERS.items())))
+        presentors = dict(reversed(list(restmore_settings.PRESENTORS.items())))
+        negotiation = resolve_negotiation(None, '*/*', serializers, presentors)
+        self.assertEqual(negotiation.accept_serializer, JSONSerializer)
+        self.assertEqual(negotiation.presentor_type, 'application/json')
+        negotiation = negotiate(None, 'text/csv', restmore_settings.VERSION)
+        self.assertEqual(negotiation.accept_serializer, CSVSerializer)
+        self.assertEqual(negotiation.presentor_type, 'text/csv')
+
+    def test_negotiate_is_memoized(self):
+        first = negotiate('application/json', 'application/json', restmore_settings.VERSION)
+        self.assertTrue(negotiate('application/json', 'application/json', restmore_settings.VERSION) is first)
+
+    def test_reconfigured_registries_are_renegotiated(self):
+        with override_settings(RESTMORE_SERIALIZERS={'application/xml': 'restmore.serializers.JSONSerializer'}):
+            negotiation = negotiate('application/json', 'application/json', restmore_settings.VERSION)
+            self.assertEqual(negotiation.error[1], 415)
+        negotiation = negotiate('application/json', 'application/json', restmore_settings.VERSION)
+        self.assertEqual(negotiation.error, None)
+
+
+class CountStrategyTestCase(TestCase):
+    def setUp(self):
+        for index in range(3):
+            User.objects.create(username='user%s' % index)
+
+    def test_exact_count(self):
+        self.assertEqual(ExactCount().count(User.objects.all()), (3, 'exact'))
+
+    def test_cached_count(self):
+        caches['default'].clear()
+        strategy = CachedCount()
+        self.assertEqual(strategy.count(User.objects.all()), (3, 'exact'))
+        with self.assertNumQueries(0):
+            self.assertEqual(strategy.count(User.objects.all()), (3, 'cached'))
+        self.assertEqual(strategy.count(User.objects.filter(username='user0')), (1, 'exact'))
+
+    def test_cached_count_empty_queryset(self):
+        caches['default'].clear()
+        strategy = CachedCount()
+        with self.assertNumQueries(0):
+            self.assertEqual(strategy.count(User.objects.none()), (0, 'exact'))
+            self.assertEqual(strategy.count(User.objects.filter(pk__in=[])), (0, 'exact'))
+
+    def test_estimated_count(self):
+        self.assertEqual(EstimatedCount(threshold=0).count(User.objects.all())[1], 'estimated')
+        self.assertEqual(EstimatedCount(threshold=10).count(User.objects.all()), (3, 'exact'))
+        self.assertEqual(EstimatedCount(threshold=0).count(User.objects.filter(username='user0')), (1, 'exact'))
+
+    def test_estimated_count_after_deletes(self):
+        if connection.vendor != 'sqlite':
+            return
+        User.objects.exclude(username='user2').delete()
+        strategy = EstimatedCount(threshold=0)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                #without statistics the highest rowid is an upper bound
+                self.assertGreaterEqual(strategy.count(User.objects.all())[0], 3)
+            cursor.execute('ANALYZE auth_user')
+        self.assertEqual(strategy.count(User.objects.all()), (1, 'estimated'))
 
 
 class SerizlierTestCase(TestCase):
@@ -122,6 +368,92 @@ class SerizlierTestCase(TestCase):
         data = serializer.serialize({"msg": "hello world"})
         self.assertEqual(data, '{"msg": "hello world"}')
 
+    def test_serialize_stream(self):
+        serializer = JSONSerializer()
+        data = {'objects': iter([{'msg': 'hello'}, {'msg': 'world'}]), 'count': 2}
+        chunks = list(serializer.serialize_stream(data))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks),
+            json.dumps({'objects': [{'msg': 'hello'}, {'msg': 'world'}], 'count': 2}))
+
+
+    def test_encode_data(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        data = {'user': user, 'users': User.objects.all(), 'price': decimal.Decimal('1.50'),
+            'when': datetime.date(2020, 1, 2), 'lazy': gettext_lazy('hello'), 'none': None,
+            'flags': [True, False], 'ratio': 0.5, 'bytes': b'caf\xc3\xa9', 1: 'one', 'rows': (x for x in 'ab')}
+        expected = json.dumps(normalize_data(dict(data, rows=iter('ab'))), cls=MoreTypesJSONEncoder)
+        self.assertEqual(encode_data(data), expected)
+        self.assertEqual(encode_data_bytes(dict(data, rows=iter('ab'))), expected.encode('ascii'))
+
+    def test_encode_data_bytes_batches(self):
+        data = [{'name': 'caf\xe9 %s' % index, 'index': index} for index in range(2000)]
+        self.assertEqual(encode_data_bytes(data), json.dumps(data).encode('ascii'))
+
+    def test_normalizing_serializer_masked_fields(self):
+        user = User.objects.create(username='foo', email='foo@domain.com')
+        serializer = NormalizingJSONSerializer()
+        serializer.normalizer = Normalizer(identity=None, authorization=None, fields={User: frozenset(['email'])})
+        content = serializer.serialize([user])
+        self.assertIsInstance(content, bytes)
+        self.assertEqual(json.loads(content), [{'email': 'foo@domain.com', 'pk': user.pk}])
+
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_multipart_deserialize_streams_files(self):
+        request = RequestFactory().put('/', encode_multipart(BOUNDARY, {
+            'name': 'report', 'upload': SimpleUploadedFile('report.txt', b'x' * 1024)}), content_type=MULTIPART_CONTENT)
+        serializer = MultipartFormSerializer()
+        serializer.request = request
+        data = serializer.deserialize(None)
+        self.assertEqual(data['name'], 'report')
+        self.assertIsInstance(data['upload'], TemporaryUploadedFile)
+        self.assertEqual(data['upload'].read(), b'x' * 1024)
+
+    def test_multipart_deserialize_reuses_parsed_post(self):
+        request = RequestFactory().post('/', {'name': 'report', 'upload': SimpleUploadedFile('report.txt', b'report')})
+        #as if a middleware had read it
+        request.POST
+        serializer = MultipartFormSerializer()
+        serializer.request = request
+        with mock.patch('restmore.serializers.MultiPartParser') as parser:
+            data = serializer.deserialize(None)
+        self.assertFalse(parser.called)
+        self.assertEqual(data['name'], 'report')
+        self.assertIs(data['upload'], request.FILES['upload'])
+
+    def test_multipart_deserialize_bad_body(self):
+        request = RequestFactory().put('/', b'junk', content_type='multipart/form-data')
+        serializer = MultipartFormSerializer()
+        serializer.request = request
+        self.assertRaises(BadRequest, serializer.deserialize, None)
+
+    def test_ndjson_serialize_rows(self):
+        serializer = NDJSONSerializer()
+        serializer.chunk_length = 20
+        rows = [{'msg': 'hello', 'when': datetime.date(2020, 1, 2)}, {'msg': 'world', 'when': None}]
+        chunks = list(serializer.serialize_rows(iter(rows)))
+        self.assertEqual(len(chunks), 2)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+            [{'msg': 'hello', 'when': '2020-01-02'}, {'msg': 'world', 'when': None}])
+        self.assertEqual(serializer.deserialize(''.join(chunks).encode('utf8'))[1]['msg'], 'world')
+        self.assertRaises(BadRequest, serializer.deserialize, b'{"msg": ')
+
+    def test_csv_serialize_rows(self):
+        serializer = CSVSerializer()
+        rows = [{'name': 'a,b', 'tags': ['x', 'y'], 'active': True, 'parent': None, 'price': decimal.Decimal('1.50')},
+            {'name': 'c', 'tags': [], 'active': False, 'parent': 2, 'price': decimal.Decimal('2')}]
+        content = ''.join(serializer.serialize_rows(iter(rows)))
+        self.assertEqual(content.splitlines(), [
+            'name,tags,active,parent,price',
+            '"a,b","[""x"", ""y""]",true,,1.50',
+            'c,[],false,2,2',
+        ])
+        self.assertEqual(serializer.serialize({'objects': rows[1:], 'pagination': {}}).splitlines()[1], 'c,[],false,2,2')
+        self.assertEqual(serializer.serialize({'error': 'nope'}), 'error\r\nnope\r\n')
+        self.assertRaises(BadRequest, serializer.deserialize, b'name\r\nc\r\n')
+
 
 class UserModelResource(DjangoModelResource):
     model = User
@@ -162,6 +494,35 @@ class ViewTestCase(TestCase):
         #print(message)
         self.assertEqual(len(message['objects']), 1)
         self.assertEqual(message['objects'][0]['username'], 'foo')
+        self.assertEqual(message['pagination']['count'], 1)
+        self.assertEqual(message['pagination']['count_method'], 'exact')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_list_html(self):
+        response = self.client.get('/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn(b'&quot;username&quot;: &quot;foo&quot;', response.content)
+
+    def test_list_sparse_fields(self):
+        response = self.client.get('/?fields=username,email')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(message['objects'], [{'username': 'foo', 'email': 'foobar@domain.com', 'pk': self.userA.pk}])
+
+    def test_list_unknown_sparse_fields(self):
+        response = self.client.get('/?fields=username,secret')
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_write_unknown_sparse_fields(self):
+        response = self.client.post('/?fields=bogus', json.dumps({
+            "username": "forshizzle",
+            "email": "rockstar@domain.com",
+        }), 'application/json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(User.objects.filter(username='forshizzle').exists())
+        response = self.client.delete('/{0}/?fields=bogus'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertTrue(User.objects.filter(pk=self.userA.pk).exists())
 
     def test_detail(self):
         response = self.client.get('/{0}/'.format(self.userA.pk))
@@ -189,6 +550,64 @@ class ViewTestCase(TestCase):
         self.assertEqual(response.status_code, 202, response.content)
         self.assertEqual(User.objects.all()[0].email, 'rockstar@domain.com')
 
+    def test_create_list(self):
+        response = self.client.post('/', json.dumps([
+            {"username": "first", "email": "first@domain.com"},
+            {"username": "second", "email": "second@domain.com"},
+            {"email": "nameless@domain.com"},
+        ]), 'application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(list(message['errors'].keys()), ['2'])
+        self.assertEqual(User.objects.all().count(), 3)
+        self.assertEqual([entry['pk'] for entry in message['objects']],
+            [User.objects.get(username=name).pk for name in ('first', 'second')])
+
+    def test_bad_create_list(self):
+        response = self.client.post('/', json.dumps([{"email": "nameless@domain.com"}]), 'application/json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(User.objects.all().count(), 1)
+
+    def test_create_multipart(self):
+        response = self.client.post('/', {"username": "forshizzle", "email": "rockstar@domain.com"})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(User.objects.get(username='forshizzle').email, 'rockstar@domain.com')
+
+    def test_update_multipart(self):
+        body = encode_multipart(BOUNDARY, {"username": "foo", "email": "rockstar@domain.com"})
+        response = self.client.put('/{0}/'.format(self.userA.pk), body, content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(User.objects.get(pk=self.userA.pk).email, 'rockstar@domain.com')
+
+    def test_update_list(self):
+        other = User.objects.create(username='bar', email='bar@domain.com')
+        response = self.client.put('/', json.dumps([
+            {"pk": self.userA.pk, "username": "foo", "email": "rockstar@domain.com"},
+            {"pk": other.pk, "username": "bar", "email": "popstar@domain.com"},
+            {"pk": 15700, "username": "ghost", "email": "ghost@domain.com"},
+        ]), 'application/json')
+        self.assertEqual(response.status_code, 202, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(len(message['objects']), 2)
+        self.assertEqual(list(message['errors'].keys()), ['2'])
+        self.assertEqual(User.objects.get(pk=other.pk).email, 'popstar@domain.com')
+        self.assertEqual(User.objects.get(pk=self.userA.pk).email, 'rockstar@domain.com')
+
+    def test_update_list_duplicate_pks(self):
+        response = self.client.put('/', json.dumps([
+            {"pk": self.userA.pk, "username": "foo", "email": "first@domain.com"},
+            {"pk": self.userA.pk, "username": "foo", "email": "second@domain.com"},
+        ]), 'application/json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(User.objects.get(pk=self.userA.pk).email, self.userA.email)
+
+    def test_form_class_is_cached(self):
+        resource = UserModelResource()
+        resource.authorization = Authorization(None, 'create')
+        form_class = resource.get_form_class()
+        self.assertTrue(UserModelResource.build_form_class(['username', 'email']) is form_class)
+        self.assertTrue(resource.get_form_class() is form_class)
+
     def test_mixedmimetype_create(self):
         #strangely test client doesn't serialize put but does serialize post!
         response = self.client.post('/', {
@@ -226,3 +645,780 @@ class ViewTestCase(TestCase):
             "email": "rockstar@domain.com",
         }), 'application/json')
         self.assertEqual(response.status_code, 400, response.content)
+
+
+class StreamingUserModelResource(UserModelResource):
+    stream_list = True
+    stream_chunk_size = 2
+
+
+class StreamingViewTestCase(TestCase):
+    urls = StreamingUserModelResource.urls()
+
+    def setUp(self):
+        for index in range(5):
+            User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+
+    def test_list(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        message = json.loads(b''.join(response.streaming_content).decode("utf-8"))
+        self.assertEqual([entry['username'] for entry in message['objects']],
+            ['user%s' % index for index in range(5)])
+
+    def test_list_html(self):
+        get_template.cache_clear()
+        for attempt in range(2):
+            response = self.client.get('/', HTTP_ACCEPT='text/html')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode('utf-8')
+            self.assertTrue(content.strip().startswith('<html>'))
+            self.assertTrue(content.strip().endswith('</html>'))
+            jsondata = content.split('<code>')[1].split('</code>')[0]
+            message = json.loads(html.unescape(jsondata))
+            self.assertEqual(len(message['objects']), 5)
+        #resolved once
+        self.assertEqual(get_template.cache_info().misses, 1)
+
+
+@override_settings(RESTMORE_SERIALIZERS={'application/json': 'restmore.serializers.NormalizingJSONSerializer'})
+class NormalizingViewTestCase(TestCase):
+    urls = UserModelResource.urls()
+
+    def setUp(self):
+        for index in range(3):
+            User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+
+    def test_list(self):
+        response = self.client.get('/?fields=username')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual([entry for entry in message['objects']],
+            [{'username': 'user%s' % index, 'pk': user.pk} for index, user in enumerate(User.objects.order_by('pk'))])
+        self.assertEqual(message['pagination']['count'], 3)
+
+    def test_detail_not_found(self):
+        response = self.client.get('/0/')
+        self.assertEqual(response.status_code, 404, response.content)
+        self.assertIn('error', json.loads(response.content.decode("utf-8")))
+
+
+timed_requests = []
+
+
+class TimedUserModelResource(UserModelResource):
+    server_timing = True
+    timing_hook = staticmethod(lambda resource, timings: timed_requests.append(timings))
+
+
+class TimingViewTestCase(TestCase):
+    urls = TimedUserModelResource.urls()
+
+    def setUp(self):
+        del timed_requests[:]
+        for index in range(3):
+            User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+
+    def test_list(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        phases = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        for phase in ('negotiate', 'authorize', 'view', 'normalize', 'inject', 'serialize', 'db', 'total'):
+            self.assertIn(phase, phases)
+        timings, = timed_requests
+        self.assertTrue(timings['queries'] >= 2)
+        self.assertTrue(timings['total'] >= timings['normalize'])
+
+    def test_signal(self):
+        received = []
+        receiver = lambda sender, resource, timings, **kwargs: received.append(timings)
+        request_timed.connect(receiver, sender=TimedUserModelResource)
+        try:
+            self.client.get('/')
+        finally:
+            request_timed.disconnect(receiver, sender=TimedUserModelResource)
+        self.assertEqual(received, timed_requests)
+
+    def test_phase_timer(self):
+        timer = PhaseTimer()
+        with timer.phase('outer'):
+            with timer.phase('inner'):
+                pass
+        self.assertEqual(set(timer.durations), set(['outer', 'inner']))
+        self.assertAlmostEqual(timer.total, timer.durations['outer'] + timer.durations['inner'])
+
+
+class ChattyUserModelResource(UserModelResource):
+    detect_n_plus_one = True
+    max_queries = {'list': 20}
+
+    def prepare(self, data):
+        if isinstance(data, User):
+            #a query per row
+            return {'username': data.username, 'groups': list(data.groups.values_list('name', flat=True))}
+        return super(ChattyUserModelResource, self).prepare(data)
+
+
+class BudgetedUserModelResource(UserModelResource):
+    max_queries = {'list': 1}
+
+
+class QueryBudgetViewTestCase(QueryBudgetTestMixin, TestCase):
+    urls = ChattyUserModelResource.urls()
+
+    def setUp(self):
+        for index in range(6):
+            User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+
+    def test_n_plus_one_raises(self):
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            self.client.get('/')
+        message = str(context.exception)
+        self.assertIn('N+1: 6 queries on auth.group filtered by auth.user_groups.user', message)
+        self.assertIn('"auth_user_groups"."user_id" = %s', message)
+
+    def test_n_plus_one_logs(self):
+        ChattyUserModelResource.raise_query_errors = False
+        try:
+            with self.assertLogs('restmore.queries', 'WARNING'):
+                response = self.client.get('/')
+        finally:
+            ChattyUserModelResource.raise_query_errors = True
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget(self):
+        queries = ['SELECT 1', 'SELECT 2']
+        self.assertEqual(len(BudgetedUserModelResource.check_queries('list', queries)), 1)
+        self.assertEqual(BudgetedUserModelResource.check_queries('detail', queries), [])
+
+    def test_assert_query_budget(self):
+        #outside of debug mode the resource does not check itself
+        with mock.patch.object(ChattyUserModelResource, 'is_debug', return_value=False):
+            with self.assertRaises(AssertionError):
+                with self.assertQueryBudget(ChattyUserModelResource, 'list'):
+                    self.client.get('/')
+        with self.assertQueryBudget(ChattyUserModelResource, 'list'):
+            list(User.objects.all())
+
+
+class UsernameOnlyModelAuthorization(DjangoModelAuthorization):
+    def get_visible_fields(self):
+        return {User: ['username', 'groups']}
+
+
+class MaskedUserModelResource(UserModelResource):
+    fields = None
+    exclude_fields = ['password']
+
+    def make_authorization(self, identity, endpoint):
+        return UsernameOnlyModelAuthorization(identity, self.model, endpoint, self.model_permissions)
+
+    def is_authenticated(self):
+        return True
+
+
+class MaskedViewTestCase(TestCase):
+    urls = MaskedUserModelResource.urls()
+
+    def setUp(self):
+        self.user = User.objects.create(username='foo', email='foo@domain.com')
+
+    def test_list(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(message['objects'], [{'username': 'foo', 'groups': [], 'pk': self.user.pk}])
+        selects = [query['sql'] for query in context.captured_queries if 'FROM "auth_user"' in query['sql']]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertNotIn('email', sql)
+
+    def test_list_reads_generation_once(self):
+        for index in range(5):
+            User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+        with mock.patch.object(permission_cache, 'get_generation', wraps=permission_cache.get_generation) as get:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(get.call_count, 1)
+
+    def test_hidden_sparse_field(self):
+        response = self.client.get('/?fields=email')
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.get('/?fields=username')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(message['objects'], [{'username': 'foo', 'pk': self.user.pk}])
+
+
+class MaskedFilteredUserModelResource(MaskedUserModelResource):
+    filter_by = ('id', 'username', 'email')
+    order_by = ('username', 'email')
+    unindexed_filters = 'allow'
+
+
+class MaskedFilterTestCase(TestCase):
+    urls = MaskedFilteredUserModelResource.urls()
+
+    def setUp(self):
+        self.user = User.objects.create(username='foo', email='foo@domain.com')
+
+    def test_hidden_filter(self):
+        response = self.client.get('/?email=foo@domain.com')
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.get('/?email__startswith=foo')
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.get('/?username=foo&id=%s' % self.user.pk)
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual([obj['pk'] for obj in message['objects']], [self.user.pk])
+
+    def test_hidden_ordering(self):
+        response = self.client.get('/?ordering=email')
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.get('/?ordering=-email')
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.get('/?ordering=-username,pk')
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class FilteredUserModelResource(UserModelResource):
+    filter_by = ('id', 'username', 'email', 'last_login')
+    order_by = ('username', 'email')
+
+
+class UnguardedUserModelResource(FilteredUserModelResource):
+    unindexed_filters = 'allow'
+
+
+class FilterViewTestCase(TestCase):
+    urls = FilteredUserModelResource.urls()
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+            for index in range(4)]
+
+    def get_usernames(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [entry['username'] for entry in json.loads(response.content.decode("utf-8"))['objects']]
+
+    def test_filters(self):
+        self.assertEqual(self.get_usernames('/?username=user1'), ['user1'])
+        self.assertEqual(self.get_usernames('/?username__in=user1,user3'), ['user1', 'user3'])
+        self.assertEqual(self.get_usernames('/?id__range=%s,%s' % (self.users[1].pk, self.users[2].pk)),
+            ['user1', 'user2'])
+        self.assertEqual(self.get_usernames('/?fields=username&username__in=user0&username__in=user2'),
+            ['user0', 'user2'])
+
+    def test_ordering(self):
+        self.assertEqual(self.get_usernames('/?ordering=-username'), ['user3', 'user2', 'user1', 'user0'])
+
+    def test_rejected(self):
+        for path in ('/?is_staff=true', '/?username__startswith=user', '/?id=abc', '/?id__range=1',
+                '/?ordering=first_name', '/?email=user1@domain.com', '/?ordering=email',
+                '/?last_login__isnull=true'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 400, path)
+
+    def test_indexed_fields(self):
+        self.assertEqual(get_indexed_fields(User), frozenset(['id', 'username']))
+
+
+class UnguardedFilterViewTestCase(TestCase):
+    urls = UnguardedUserModelResource.urls()
+
+    def setUp(self):
+        User.objects.create(username='foo', email='foo@domain.com')
+        User.objects.create(username='bar', email='bar@domain.com', last_login=timezone.now())
+
+    def test_unindexed_filters(self):
+        response = self.client.get('/?email=foo@domain.com&last_login__isnull=true&ordering=email')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual([entry['username'] for entry in message['objects']], ['foo'])
+
+
+class BatchUserModelResource(UserModelResource):
+    max_batch_size = 3
+
+
+class BatchViewTestCase(TestCase):
+    urls = BatchUserModelResource.urls()
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+            for index in range(4)]
+
+    def test_batch(self):
+        first, second, third = self.users[2].pk, self.users[0].pk, 15700
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/?mode=batch&pk=%s&pk=%s,%s&pk=%s' % (first, second, third, first))
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual([entry['username'] for entry in message['objects']], ['user2', 'user0'])
+        self.assertEqual(message['missing'], [third])
+        self.assertNotIn('pagination', message)
+        selects = [query['sql'] for query in context.captured_queries if 'FROM "auth_user"' in query['sql']]
+        self.assertEqual(len(selects), 1)
+
+    def test_batch_limits(self):
+        for path in ('/?mode=batch', '/?mode=batch&pk=a', '/?mode=batch&pk=1,2,3,4'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 400, path)
+
+    def test_pk_without_mode_lists(self):
+        response = self.client.get('/?pk=%s' % self.users[0].pk)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(len(message['objects']), 4)
+
+
+class EmptyCachedCountUserModelResource(UserModelResource):
+    count_strategy = CachedCount()
+
+    def get_queryset(self):
+        return super(EmptyCachedCountUserModelResource, self).get_queryset().none()
+
+
+class EmptyCachedCountViewTestCase(TestCase):
+    urls = EmptyCachedCountUserModelResource.urls()
+
+    def test_list(self):
+        User.objects.create(username='foo', email='foo@domain.com')
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(message['objects'], [])
+        self.assertEqual(message['pagination']['count'], 0)
+
+
+class ExportUserModelResource(UserModelResource):
+    exportable = True
+    export_chunk_size = 2
+    filter_by = ('id', 'username')
+
+
+class PermittedExportUserModelResource(ExportUserModelResource):
+    def is_authenticated(self):
+        return self.authorization.is_authorized()
+
+
+class ExportViewTestCase(TestCase):
+    urls = ExportUserModelResource.urls()
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+            for index in (2, 0, 1)]
+
+    def export(self, accept, path='/export/?fields=username,email'):
+        response = self.client.get(path, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], accept)
+        return b''.join(response.streaming_content).decode('utf8')
+
+    def test_urls(self):
+        self.assertEqual([pattern.name for pattern in ExportUserModelResource.urls()],
+            ['api_exportusermodel_list', 'api_exportusermodel_export', 'api_exportusermodel_detail'])
+        self.assertEqual(len(UserModelResource.urls()), 2)
+
+    def test_ndjson(self):
+        with CaptureQueriesContext(connection) as context:
+            content = self.export('application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows, [{'username': user.username, 'email': user.email, 'pk': user.pk}
+            for user in sorted(self.users, key=lambda user: user.pk)])
+        selects = [query['sql'] for query in context.captured_queries if 'FROM "auth_user"' in query['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('ORDER BY "auth_user"."id" ASC', selects[0])
+
+    def test_csv(self):
+        content = self.export('text/csv', '/export/?fields=username,email&username__in=user0,user1')
+        self.assertEqual(content.splitlines(), ['username,email,pk',
+            'user0,user0@domain.com,%s' % self.users[1].pk, 'user1,user1@domain.com,%s' % self.users[2].pk])
+
+    def test_json(self):
+        message = json.loads(self.export('application/json'))
+        self.assertEqual(len(message['objects']), 3)
+
+    def test_failed_export_ends_with_error_line(self):
+        def iter_rows(resource, data, chunk_size=None):
+            yield self.users[0]
+            raise DatabaseError('connection lost')
+
+        with mock.patch.object(ExportUserModelResource, 'iter_rows', iter_rows):
+            with self.assertLogs('restmore.export', 'ERROR'):
+                content = self.export('application/x-ndjson')
+            self.assertIn('error', json.loads(content.splitlines()[-1]))
+            with self.assertLogs('restmore.export', 'ERROR'):
+                content = self.export('text/csv')
+            self.assertTrue(content.splitlines()[-1].startswith('ERROR: '))
+
+    def test_bad_filter(self):
+        response = self.client.get('/export/?email=user0@domain.com', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_list_is_unchanged(self):
+        response = self.client.get('/?fields=username', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200, response.content)
+        lines = response.content.decode('utf8').splitlines()
+        self.assertEqual(lines[0], 'username,pk')
+        self.assertEqual(sorted(lines[1:]), ['%s,%s' % (user.username, user.pk) for user in
+            sorted(self.users, key=lambda user: user.username)])
+
+
+class ExportPermissionTestCase(TestCase):
+    urls = PermittedExportUserModelResource.urls()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='foo', email='foo@domain.com', password='foobar')
+        self.client.force_login(self.user)
+        #keep the cache's receivers off the user model, see FastDeleteViewTestCase
+        patcher = mock.patch.object(permission_cache, 'connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_needs_permission(self):
+        response = self.client.get('/export/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, 401, response.content)
+        self.user.user_permissions.add(Permission.objects.get(codename='view_user'))
+        permission_cache.invalidate()
+        response = self.client.get('/export/?fields=username', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf8')
+        self.assertEqual(json.loads(content), {'username': 'foo', 'pk': self.user.pk})
+
+
+class CursorUserModelResource(UserModelResource):
+    cursor_ordering = ('-username',)
+
+
+class CursorViewTestCase(TestCase):
+    urls = CursorUserModelResource.urls()
+
+    def setUp(self):
+        for index in range(5):
+            User.objects.create(username='user%s' % index, email='user%s@domain.com' % index)
+
+    def get_page(self, **params):
+        response = self.client.get('/', dict(params, paginate_by=2))
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content.decode("utf-8"))
+
+    def test_list_walks_forward_and_back(self):
+        first = self.get_page()
+        self.assertEqual([entry['username'] for entry in first['objects']], ['user4', 'user3'])
+        self.assertEqual(first['pagination']['previous_cursor'], None)
+        second = self.get_page(cursor=first['pagination']['next_cursor'])
+        self.assertEqual([entry['username'] for entry in second['objects']], ['user2', 'user1'])
+        last = self.get_page(cursor=second['pagination']['next_cursor'])
+        self.assertEqual([entry['username'] for entry in last['objects']], ['user0'])
+        self.assertEqual(last['pagination']['next_cursor'], None)
+        back = self.get_page(cursor=second['pagination']['previous_cursor'])
+        self.assertEqual([entry['username'] for entry in back['objects']], ['user4', 'user3'])
+
+    def test_list_bad_cursor(self):
+        response = self.client.get('/?cursor=foobar')
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_list_tampered_cursor(self):
+        for values in (['user1', 'abc'], [None, 1], ['user1'], 'user1'):
+            cursor = urlsafe_base64_encode(json.dumps({'v': values}).encode('utf8'))
+            response = self.client.get('/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, values)
+
+    def test_list_cursor_values_are_converted(self):
+        paginator = CursorPaginator(User.objects.all(), ('-date_joined',), 2)
+        when = timezone.now()
+        values, reverse = paginator.decode_cursor(paginator.encode_cursor([when, 1]))
+        self.assertEqual(values, [when, 1])
+        self.assertEqual(len(paginator.page(paginator.encode_cursor([when, 1]))), 2)
+
+    def test_nullable_cursor_ordering(self):
+        with self.assertRaises(ImproperlyConfigured):
+            type('LoginCursorUserModelResource', (UserModelResource,), {'cursor_ordering': ('-last_login',)})
+
+
+class RelationPlanViewTestCase(TestCase):
+    urls = UserModelResource.urls()
+
+    def setUp(self):
+        self.group = Group.objects.create(name='staff')
+        self.permissions = list(Permission.objects.all()[:3])
+
+    def add_users(self, count):
+        for index in range(count):
+            user = User.objects.create(username='user%s_%s' % (User.objects.count(), index))
+            user.groups.add(self.group)
+            user.user_permissions.add(*self.permissions)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context)
+
+    def test_list_query_count_is_constant(self):
+        self.add_users(2)
+        few = self.count_list_queries()
+        self.add_users(8)
+        self.assertEqual(self.count_list_queries(), few)
+
+
+class FastDeleteUserModelResource(UserModelResource):
+    fast_delete = True
+    delete_chunk_size = 2
+
+
+class FastDeleteViewTestCase(TestCase):
+    urls = FastDeleteUserModelResource.urls()
+
+    def setUp(self):
+        self.group = Group.objects.create(name='staff')
+        self.users = [User.objects.create(username='user%s' % index) for index in range(5)]
+        for user in self.users:
+            user.groups.add(self.group)
+
+    def test_delete_list(self):
+        pks = [user.pk for user in self.users[:3]]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete('/?' + '&'.join('pk=%s' % pk for pk in pks))
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(User.groups.through.objects.count(), 2)
+        #no user rows were loaded into memory
+        self.assertFalse(any('"auth_user"."password"' in query['sql'] for query in context.captured_queries))
+
+    def test_delete_list_falls_back_with_receivers(self):
+        receiver = lambda **kwargs: None
+        signals.post_delete.connect(receiver, sender=User)
+        try:
+            self.assertEqual(FastDeleteUserModelResource().get_fast_delete_plan(), None)
+        finally:
+            signals.post_delete.disconnect(receiver, sender=User)
+        self.assertEqual(len(FastDeleteUserModelResource().get_fast_delete_plan()), 2)
+
+
+class ConditionalUserModelResource(UserModelResource):
+    conditional_get = True
+    modified_field = 'date_joined'
+
+
+class HashedUserModelResource(UserModelResource):
+    conditional_get = True
+
+
+class ConditionalViewTestCase(TestCase):
+    urls = ConditionalUserModelResource.urls()
+
+    def setUp(self):
+        self.user = User.objects.create(username='foo', email='foo@domain.com')
+
+    def test_list_not_modified(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        #deletes do not move MAX(modified_field), collections only get an ETag
+        self.assertFalse(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_list_modified(self):
+        etag = self.client.get('/')['ETag']
+        User.objects.create(username='bar', email='bar@domain.com')
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_modified_by_delete(self):
+        other = User.objects.create(username='bar', email='bar@domain.com')
+        User.objects.filter(pk=self.user.pk).update(date_joined=other.date_joined - datetime.timedelta(days=1))
+        response = self.client.get('/')
+        since = response.get('Last-Modified', http_date(timezone.now().timestamp()))
+        self.user.delete()
+        response = self.client.get('/', HTTP_IF_MODIFIED_SINCE=since, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get('/', HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual([entry['username'] for entry in message['objects']], ['bar'])
+
+    def test_detail_not_modified(self):
+        response = self.client.get('/{0}/'.format(self.user.pk))
+        response = self.client.get('/{0}/'.format(self.user.pk), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class HashedConditionalViewTestCase(TestCase):
+    urls = HashedUserModelResource.urls()
+
+    def test_list_not_modified(self):
+        User.objects.create(username='foo', email='foo@domain.com')
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class CachedUserModelResource(UserModelResource):
+    response_cache = ResponseCache(key_prefix='restmore.tests.response')
+
+
+class ResponseCacheViewTestCase(TestCase):
+    urls = CachedUserModelResource.urls()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create(username='foo', email='foo@domain.com')
+
+    def tearDown(self):
+        CachedUserModelResource.response_cache.disconnect(User)
+
+    def test_list_is_cached(self):
+        stats = CachedUserModelResource.response_cache.stats()
+        first = self.client.get('/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(CachedUserModelResource.response_cache.stats(),
+            {'hits': stats['hits'] + 1, 'misses': stats['misses'] + 1})
+
+    def test_cache_key_varies_with_query(self):
+        self.client.get('/')
+        response = self.client.get('/?fields=username')
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(message['objects'], [{'username': 'foo', 'pk': self.user.pk}])
+
+    def test_save_invalidates(self):
+        self.client.get('/{0}/'.format(self.user.pk))
+        self.user.email = 'rockstar@domain.com'
+        self.user.save()
+        response = self.client.get('/{0}/'.format(self.user.pk))
+        self.assertEqual(json.loads(response.content.decode("utf-8"))['email'], 'rockstar@domain.com')
+
+    def test_html_reuses_cached_json(self):
+        body = self.client.get('/{0}/'.format(self.user.pk)).content.decode('utf-8')
+        with mock.patch.object(JSONSerializer, 'serialize') as serialize:
+            response = self.client.get('/{0}/'.format(self.user.pk), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(serialize.called)
+        jsondata = response.content.decode('utf-8').split('<code>')[1].split('</code>')[0]
+        self.assertEqual(html.unescape(jsondata), body)
+
+    def test_bulk_write_invalidates(self):
+        self.client.get('/')
+        self.client.post('/', json.dumps([{"username": "bar", "email": "bar@domain.com"}]), 'application/json')
+        message = json.loads(self.client.get('/').content.decode("utf-8"))
+        self.assertEqual(len(message['objects']), 2)
+
+
+class AsyncUserModelResource(AsyncDjangoModelResource):
+    model = User
+    fields = ['username', 'email']
+
+    def is_debug(self):
+        return True
+
+    def is_authenticated(self):
+        return True
+
+
+class AsyncViewTestCase(TestCase):
+    urls = AsyncUserModelResource.urls()
+
+    def setUp(self):
+        self.userA = User.objects.create(username='foo', email='foobar@domain.com')
+
+    async def test_list(self):
+        response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(message['objects'][0]['username'], 'foo')
+        self.assertEqual(message['pagination']['count'], 1)
+
+    async def test_list_outofbound_page_num(self):
+        response = await self.async_client.get('/?page=10000')
+        self.assertEqual(response.status_code, 410, response.content)
+
+    async def test_detail(self):
+        response = await self.async_client.get('/{0}/'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(json.loads(response.content.decode("utf-8"))['username'], 'foo')
+
+    async def test_detail_404(self):
+        response = await self.async_client.get('/15700/')
+        self.assertEqual(response.status_code, 404, response.content)
+
+    async def test_batch(self):
+        response = await self.async_client.get('/?mode=batch&pk=15700,{0}'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 200, response.content)
+        message = json.loads(response.content.decode("utf-8"))
+        self.assertEqual([entry['username'] for entry in message['objects']], ['foo'])
+        self.assertEqual(message['missing'], [15700])
+
+    async def test_create(self):
+        response = await self.async_client.post('/', json.dumps({
+            "username": "forshizzle",
+            "email": "rockstar@domain.com",
+        }), 'application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(json.loads(response.content.decode("utf-8"))['username'], 'forshizzle')
+
+    async def test_delete(self):
+        response = await self.async_client.delete('/{0}/'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 204, response.content)
+
+
+class BudgetedAsyncUserModelResource(AsyncUserModelResource):
+    max_queries = {'list': 1}
+    server_timing = True
+
+
+class AsyncBudgetViewTestCase(TestCase):
+    urls = BudgetedAsyncUserModelResource.urls()
+
+    def setUp(self):
+        self.userA = User.objects.create(username='foo', email='foobar@domain.com')
+
+    async def test_list_over_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            await self.async_client.get('/')
+
+    async def test_detail_is_timed(self):
+        response = await self.async_client.get('/{0}/'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+        self.assertIn('negotiate;dur=', response['Server-Timing'])
+
+    async def test_delete_is_atomic(self):
+        with mock.patch.object(transaction.Atomic, '__enter__', autospec=True,
+                side_effect=transaction.Atomic.__enter__) as enter:
+            response = await self.async_client.delete('/{0}/'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertTrue(enter.called)
+
+
+class QueryingAsyncUserModelResource(AsyncUserModelResource):
+    def get_queryset(self):
+        #touches the database while the queryset is built
+        active = list(User.objects.filter(is_active=True).values_list('pk', flat=True))
+        return super(QueryingAsyncUserModelResource, self).get_queryset().filter(pk__in=active)
+
+
+class AsyncQuerysetViewTestCase(TestCase):
+    urls = QueryingAsyncUserModelResource.urls()
+
+    def setUp(self):
+        self.userA = User.objects.create(username='foo', email='foobar@domain.com')
+
+    async def test_list(self):
+        response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(json.loads(response.content.decode("utf-8"))['objects'][0]['username'], 'foo')
+
+    async def test_detail(self):
+        response = await self.async_client.get('/{0}/'.format(self.userA.pk))
+        self.assertEqual(response.status_code, 200, response.content)
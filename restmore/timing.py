@@ -0,0 +1,151 @@
+'''
+Per phase request timing, reported with a `Server-Timing` header and to hooks
+
+    class MyResource(DjangoModelResource):
+        server_timing = True
+        timing_hook = staticmethod(lambda resource, timings: statsd.timing(...))
+
+or connect to the `request_timed` signal.
+'''
+import time
+from contextlib import ExitStack
+from django.db import connections
+from django.dispatch import Signal
+
+#sent with `resource` and `timings` once a timed request has been handled
+request_timed = Signal()
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullTimer(object):
+    '''
+    Stands in when timing is disabled
+    '''
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+
+null_timer = NullTimer()
+
+
+class _Phase(object):
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.nested = 0.0
+
+    def __enter__(self):
+        self.timer._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        timer = self.timer
+        timer._stack.pop()
+        #phases are exclusive, time spent in a nested phase belongs to it alone
+        timer.durations[self.name] = timer.durations.get(self.name, 0.0) + elapsed - self.nested
+        if timer._stack:
+            timer._stack[-1].nested += elapsed
+        else:
+            timer.total += elapsed
+        return False
+
+
+class PhaseTimer(object):
+    '''
+    Accumulates the exclusive time of named phases along with the number and
+    duration of database queries, which overlap the phases that issued them
+    '''
+    enabled = True
+
+    def __init__(self):
+        self.durations = {}
+        self.total = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self._stack = []
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def __call__(self, execute, sql, params, many, context):
+        #a django database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - start
+
+    def record_queries(self):
+        '''
+        Returns a context manager that counts queries on every database connection
+        '''
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    def get_timings(self):
+        '''
+        Seconds per phase plus `db`, `total` and the `queries` count
+        '''
+        timings = dict(self.durations)
+        timings.update(db=self.query_time, total=self.total, queries=self.queries)
+        return timings
+
+    def header(self):
+        entries = ['%s;dur=%.3f' % (name, seconds * 1000) for name, seconds in self.durations.items()]
+        entries.append('db;dur=%.3f;desc="%s queries"' % (self.query_time * 1000, self.queries))
+        entries.append('total;dur=%.3f' % (self.total * 1000))
+        return ', '.join(entries)
+
+
+class TimingMixin(object):
+    '''
+    Times negotiation, authorization, the view, normalization, presentor
+    injection and serialization of each request. Disabled unless `server_timing`
+    is set, a `timing_hook` is given or `request_timed` has receivers
+    '''
+    timer = null_timer
+    #add a Server-Timing header to responses
+    server_timing = False
+    #callable receiving `(resource, timings)`
+    timing_hook = None
+
+    def is_timed(self):
+        return self.server_timing or self.timing_hook is not None or \
+            request_timed.has_listeners(type(self))
+
+    def handle(self, endpoint, *args, **kwargs):
+        if not self.is_timed():
+            return super(TimingMixin, self).handle(endpoint, *args, **kwargs)
+        self.timer = PhaseTimer()
+        with self.timer.record_queries():
+            #the view phase is whatever time the other phases do not claim
+            with self.timer.phase('view'):
+                response = super(TimingMixin, self).handle(endpoint, *args, **kwargs)
+        return self.finish_timing(response)
+
+    def finish_timing(self, response):
+        if self.server_timing:
+            #streamed bodies are serialized after this point and are not included
+            response['Server-Timing'] = self.timer.header()
+        self.report_timings(self.timer.get_timings())
+        return response
+
+    def report_timings(self, timings):
+        if self.timing_hook is not None:
+            self.timing_hook(self, timings)
+        request_timed.send(sender=type(self), resource=self, timings=timings)